@@ -0,0 +1,183 @@
+import mimetypes
+import os
+import re
+import zlib
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.db.models.fields.files import FieldFile
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from core.constants import DOWNLOAD_CHUNK_SIZE
+from idp.settings import FILE_DOWNLOAD_ACCEL_PREFIX, FILE_DOWNLOAD_OFFLOAD
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_file_validators(
+    field_file: FieldFile, size: int
+) -> Tuple[str, Optional[int]]:
+    """
+    Возвращает ETag и время изменения файла (timestamp).
+
+    ETag строится по размеру и времени изменения, как в nginx,
+    поэтому файл не нужно читать. Если хранилище не отдает время
+    изменения, ETag строится только по размеру и имени.
+    """
+    try:
+        modified = int(
+            field_file.storage.get_modified_time(field_file.name).timestamp()
+        )
+    except NotImplementedError:
+        name_hash = zlib.crc32(field_file.name.encode())
+        return f'"{size:x}-{name_hash:x}"', None
+    return f'"{size:x}-{modified:x}"', modified
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range с одним диапазоном.
+
+    Возвращает (start, end) включительно или None, если заголовка
+    нет или он не поддерживается (тогда отдается весь файл).
+    Для недостижимого диапазона бросает ValueError.
+    """
+    match = RANGE_RE.match(header or "")
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 - последние 500 байт
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def is_range_fresh(
+    request: HttpRequest, etag: str, modified: Optional[int]
+) -> bool:
+    """Проверяет If-Range: диапазон отдается, только если файл не менялся."""
+    if_range = request.headers.get("If-Range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return modified is not None and parse_http_date_safe(if_range) == modified
+
+
+async def read_range(file, start: int, length: int) -> AsyncIterator[bytes]:
+    """
+    Читает часть файла блоками и закрывает файл в конце.
+
+    Блоки читаются в отдельном потоке через sync_to_async, поэтому
+    под ASGI ответ отправляется по мере чтения, а не целиком.
+    """
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        await sync_to_async(file.seek, thread_sensitive=False)(start)
+        while length > 0:
+            chunk = await read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def get_file_response(
+    file, filename: str, start: int, length: int, status: int = 200
+) -> StreamingHttpResponse:
+    """Возвращает ответ, который отдает length байт файла с start."""
+    content_type, _ = mimetypes.guess_type(filename)
+    response = StreamingHttpResponse(
+        read_range(file, start, length),
+        status=status,
+        content_type=content_type or "application/octet-stream",
+    )
+    response["Content-Length"] = str(length)
+    response[
+        "Content-Disposition"
+    ] = f"attachment; filename*=utf-8''{quote(filename)}"
+    return response
+
+
+def get_offload_response(field_file: FieldFile, filename: str):
+    """
+    Возвращает пустой ответ, файл по которому отдает прокси-сервер.
+
+    Для nginx (X-Accel-Redirect) путь строится от internal location
+    FILE_DOWNLOAD_ACCEL_PREFIX, для Apache/lighttpd (X-Sendfile)
+    передается путь к файлу на диске.
+    """
+    content_type, _ = mimetypes.guess_type(filename)
+    response = HttpResponse(
+        content_type=content_type or "application/octet-stream"
+    )
+    if FILE_DOWNLOAD_OFFLOAD == "x-accel-redirect":
+        response["X-Accel-Redirect"] = quote(
+            f"{FILE_DOWNLOAD_ACCEL_PREFIX}{field_file.name}"
+        )
+    else:
+        response["X-Sendfile"] = field_file.path
+    response[
+        "Content-Disposition"
+    ] = f"attachment; filename*=utf-8''{quote(filename)}"
+    return response
+
+
+def serve_file(
+    request: HttpRequest, field_file: FieldFile, filename: Optional[str] = None
+) -> HttpResponse:
+    """
+    Отдает файл потоком с поддержкой Range и условных запросов.
+
+    Файл читается блоками по DOWNLOAD_CHUNK_SIZE асинхронным итератором
+    и не загружается в память целиком. Если задан FILE_DOWNLOAD_OFFLOAD,
+    передачу выполняет прокси-сервер, а Python не читает файл вовсе.
+    filename - имя для Content-Disposition, по умолчанию имя в хранилище.
+    """
+    filename = filename or os.path.basename(field_file.name)
+    if FILE_DOWNLOAD_OFFLOAD:
+        return get_offload_response(field_file, filename)
+
+    size = field_file.size
+    etag, modified = get_file_validators(field_file, size)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+    if response is not None:
+        return response
+
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range is not None and not is_range_fresh(request, etag, modified):
+        byte_range = None
+
+    file = field_file.storage.open(field_file.name, "rb")
+    if byte_range is None:
+        response = get_file_response(file, filename, 0, size)
+    else:
+        start, end = byte_range
+        response = get_file_response(
+            file, filename, start, end - start + 1, status=206
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if modified is not None:
+        response["Last-Modified"] = http_date(modified)
+    return response
@@ -0,0 +1,308 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, OrderBy, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+KEYSET_ALIAS = "_keyset_{}"
+# значения ключа в курсоре - только скаляры JSON
+CURSOR_VALUE_TYPES = (str, int, float, bool, type(None))
+# так Django сообщает о значении, не подходящем к типу поля
+CURSOR_VALUE_ERRORS = (ValidationError, TypeError, ValueError)
+
+
+class KeysetEncoder(DjangoJSONEncoder):
+    """Сохраняет время с микросекундами, иначе ключи страниц не совпадут."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с курсорным режимом по запросу.
+
+    По умолчанию работает как PageNumberPagination. С параметром
+    ?pagination=cursor (или ?cursor=...) страница выбирается по ключу
+    последней строки: текущая сортировка queryset плюс pk, без OFFSET
+    и COUNT(*), поэтому время не зависит от номера страницы.
+    """
+
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    cursor_mode = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def is_cursor_request(self, request: Request) -> bool:
+        """Проверяет, запрошен ли курсорный режим."""
+        params = request.query_params
+        return (
+            params.get(self.mode_query_param) == self.cursor_mode
+            or self.cursor_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_cursor_request(request):
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_keyset(queryset, request)
+
+    def paginate_keyset(self, queryset: QuerySet, request: Request):
+        """Возвращает страницу строк после (или до) ключа из курсора."""
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+        self.ordering = self.get_ordering(queryset)
+        if reverse:
+            ordering = [
+                (field, not desc, not nulls_first)
+                for field, desc, nulls_first in self.ordering
+            ]
+        else:
+            ordering = self.ordering
+
+        queryset = queryset.annotate(
+            **{
+                KEYSET_ALIAS.format(index): F(field)
+                for index, (field, _, _) in enumerate(ordering)
+            }
+        ).order_by(
+            *(
+                OrderBy(
+                    F(field),
+                    descending=desc,
+                    nulls_first=nulls_first or None,
+                    nulls_last=not nulls_first or None,
+                )
+                for field, desc, nulls_first in ordering
+            )
+        )
+        if values is not None and len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            if values is not None:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, values)
+                )
+            rows = list(queryset[: self.page_size + 1])
+        except CURSOR_VALUE_ERRORS:
+            raise NotFound(self.invalid_cursor_message)
+        return self.set_page(rows, values, reverse)
+
+    def set_page(
+        self, rows: List[Any], values: Optional[list], reverse: bool
+    ) -> List[Any]:
+        """Запоминает страницу; лишняя строка значит, что есть еще одна."""
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.rows = rows
+        return rows
+
+    def get_ordering(self, queryset: QuerySet) -> List[Tuple[str, bool, bool]]:
+        """
+        Возвращает сортировку queryset и pk.
+
+        Каждый элемент - (поле, по убыванию, NULL первыми). Без явного
+        nulls_first/nulls_last NULL идут как в PostgreSQL: первыми
+        при убывании и последними при возрастании.
+        """
+        order_by = queryset.query.order_by
+        if not order_by and queryset.query.default_ordering:
+            order_by = queryset.model._meta.ordering
+        ordering = []
+        for item in order_by:
+            if isinstance(item, str):
+                desc = item.startswith("-")
+                ordering.append((item.lstrip("-"), desc, desc))
+            elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+                if item.nulls_first or item.nulls_last:
+                    nulls_first = bool(item.nulls_first)
+                else:
+                    nulls_first = item.descending
+                ordering.append(
+                    (item.expression.name, item.descending, nulls_first)
+                )
+            else:
+                raise ImproperlyConfigured(
+                    f"Keyset pagination cannot order by {item!r}, "
+                    "use field names or F() expressions."
+                )
+        pk_name = queryset.model._meta.pk.name
+        if not any(field in ("pk", pk_name) for field, _, _ in ordering):
+            ordering.append(("pk", False, False))
+        return ordering
+
+    def get_keyset_filter(
+        self, ordering: List[Tuple[str, bool, bool]], values: List[Any]
+    ) -> Q:
+        """Строит условие "строка после ключа" с учетом NULL."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, desc, nulls_first), value in zip(ordering, values):
+            condition |= equal & self.get_after_filter(
+                field, desc, nulls_first, value
+            )
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_after_filter(
+        self, field: str, desc: bool, nulls_first: bool, value: Any
+    ) -> Q:
+        if value is None:
+            # после NULL идут все значения, если NULL первыми
+            if nulls_first:
+                return Q(**{f"{field}__isnull": False})
+            return Q(pk__in=[])
+        after = Q(**{f"{field}__{'lt' if desc else 'gt'}": value})
+        if nulls_first:
+            return after
+        return after | Q(**{f"{field}__isnull": True})
+
+    def get_row_key(self, row: Any) -> list:
+        """Возвращает значения полей сортировки строки."""
+        return [
+            getattr(row, KEYSET_ALIAS.format(index))
+            for index in range(len(self.ordering))
+        ]
+
+    def encode_cursor(self, values: list, reverse: bool) -> str:
+        data = json.dumps({"v": values, "r": reverse}, cls=KeysetEncoder)
+        return b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request: Request) -> Tuple[Optional[list], bool]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode()).decode())
+            values, reverse = list(data["v"]), bool(data["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_cursor_link(self, row: Any, reverse: bool) -> str:
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        cursor = self.encode_cursor(self.get_row_key(row), reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self.get_cursor_link(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self.get_cursor_link(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class UnionKeysetPagination(KeysetPagination):
+    """
+    Курсорная пагинация для объединения таблиц через UNION ALL.
+
+    Каждая часть объединения - values() queryset с одинаковыми
+    колонками, среди которых date, kind и item_id. Строки идут
+    по убыванию (date, kind, item_id). Условие курсора применяется
+    к каждой части до объединения, поэтому каждая часть может
+    использовать свой индекс.
+    """
+
+    ordering = ("date", "kind", "item_id")
+
+    def paginate_union(
+        self, parts: Dict[str, QuerySet], request: Request
+    ) -> List[Dict[str, Any]]:
+        """Возвращает страницу строк; parts - части объединения по kind."""
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+        if values is not None and len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            union = self.get_union(parts, values, reverse)
+            rows = list(union[: self.page_size + 1])
+        except CURSOR_VALUE_ERRORS:
+            raise NotFound(self.invalid_cursor_message)
+        return self.set_page(rows, values, reverse)
+
+    def get_union(
+        self, parts: Dict[str, QuerySet], values: Optional[list], reverse: bool
+    ) -> QuerySet:
+        """Возвращает объединение частей после ключа в порядке страницы."""
+        querysets = [
+            (
+                queryset
+                if values is None
+                else queryset.filter(
+                    self.get_part_filter(kind, values, reverse)
+                )
+            )
+            for kind, queryset in parts.items()
+        ]
+        prefix = "" if reverse else "-"
+        ordering = [prefix + field for field in self.ordering]
+        features = connections[querysets[0].db].features
+        if features.supports_slicing_ordering_in_compound:
+            # каждая часть отдает не больше строк, чем нужно странице
+            querysets = [
+                queryset.order_by(*ordering)[: self.page_size + 1]
+                for queryset in querysets
+            ]
+        union = querysets[0].union(*querysets[1:], all=True)
+        return union.order_by(*ordering)
+
+    def get_part_filter(self, kind: str, values: list, reverse: bool) -> Q:
+        """Строит условие курсора для части объединения с данным kind."""
+        date, cursor_kind, item_id = values
+        strict, inclusive = ("gt", "gte") if reverse else ("lt", "lte")
+        if kind == cursor_kind:
+            return Q(**{f"date__{strict}": date}) | Q(
+                date=date, **{f"pk__{strict}": item_id}
+            )
+        # при равной дате строки этой части идут после строки курсора
+        if (kind < cursor_kind) != reverse:
+            return Q(**{f"date__{inclusive}": date})
+        return Q(**{f"date__{strict}": date})
+
+    def get_row_key(self, row: Dict[str, Any]) -> list:
+        return [row[field] for field in self.ordering]
@@ -0,0 +1,83 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingRenderer(BaseRenderer, ABC):
+    """
+    Рендерер, который умеет отдавать строки списка по одной.
+
+    Списки рендерятся через stream() в StreamingHttpResponse,
+    остальные ответы (объект, ошибка) - обычным render().
+    """
+
+    charset = "utf-8"
+
+    @abstractmethod
+    def stream(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """Возвращает части ответа для строк rows."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return "".join(self.stream(rows)).encode(self.charset)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Отдает каждую строку списка отдельным JSON на своей строке."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def stream(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        for row in rows:
+            yield json.dumps(row, cls=JSONEncoder, ensure_ascii=False) + "\n"
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    Отдает список в CSV.
+
+    Вложенные объекты разворачиваются в колонки через точку
+    (employee.last_name), списки записываются как JSON.
+    Заголовок строится по первой строке.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+
+    class Echo:
+        """Файлоподобный объект, который возвращает записанную строку."""
+
+        def write(self, value: str) -> str:
+            return value
+
+    def flatten(self, row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+        flat = {}
+        for key, value in row.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                flat.update(self.flatten(value, f"{name}."))
+            elif isinstance(value, list):
+                flat[name] = json.dumps(
+                    value, cls=JSONEncoder, ensure_ascii=False
+                )
+            else:
+                flat[name] = value
+        return flat
+
+    def stream(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        writer = None
+        for row in rows:
+            row = self.flatten(row)
+            if writer is None:
+                writer = csv.DictWriter(
+                    self.Echo(), fieldnames=list(row), extrasaction="ignore"
+                )
+                yield writer.writeheader()
+            yield writer.writerow(row)
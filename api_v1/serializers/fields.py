@@ -28,10 +28,18 @@ class IDPasFieldSerializer(serializers.ModelSerializer):
     """
 
     employee = serializers.SerializerMethodField()
+    progress = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = IDP
-        fields = ("idp_id", "name", "employee", "end_date_plan", "status")
+        fields = (
+            "idp_id",
+            "name",
+            "employee",
+            "end_date_plan",
+            "status",
+            "progress",
+        )
 
     def get_employee(self, obj: IDP) -> Dict[str, str]:
         data = {
@@ -2,10 +2,13 @@ import logging
 
 from rest_framework import serializers
 
+from core.constants import UPLOAD_MAX_SIZE
 from core.utils import get_extensions
+from idp_app.blobs import store_file
 from idp_app.models import (
     IDP,
     File,
+    FileUpload,
     IdpNotification,
     Notification,
     Task,
@@ -50,6 +53,51 @@ class IDPNotificationSerializer(serializers.ModelSerializer):
         fields = ("in_id", "notification", "idp", "message", "date", "status")
 
 
+class InboxNotificationSerializer(serializers.Serializer):
+    """Сериализатор уведомления из общего списка уведомлений пользователя."""
+
+    id = serializers.IntegerField(source="item_id")
+    kind = serializers.CharField()
+    notification = serializers.CharField(source="notification_name")
+    idp = serializers.UUIDField(source="idp_ref")
+    task = serializers.IntegerField(source="task_ref", allow_null=True)
+    message = serializers.CharField(allow_null=True)
+    date = serializers.DateTimeField()
+    status = serializers.CharField()
+
+
+class NotificationIdsSerializer(serializers.Serializer):
+    """Сериализатор списков id уведомлений по ИПР и по задачам."""
+
+    idp = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+    task = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list
+    )
+
+    def validate(self, attrs):
+        if not attrs["idp"] and not attrs["task"]:
+            raise serializers.ValidationError(
+                "Нужно передать id уведомлений в idp или task."
+            )
+        return attrs
+
+
+class NotificationsBeforeSerializer(serializers.Serializer):
+    """Сериализатор даты, раньше которой уведомления будут прочитаны."""
+
+    before = serializers.DateTimeField()
+
+
+class MarkedReadSerializer(serializers.Serializer):
+    """Сериализатор количества прочитанных уведомлений."""
+
+    idp = serializers.IntegerField()
+    task = serializers.IntegerField()
+    total = serializers.IntegerField()
+
+
 class CreateIDPNotificationSerializer(serializers.ModelSerializer):
     """Сериализатор создания модели IdpNotification."""
 
@@ -93,6 +141,7 @@ class IDPReadOnlySerializer(serializers.ModelSerializer):
     """Сериализатор для чтения IDP."""
 
     tasks = TaskAsFieldSerializer(many=True)
+    progress = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = IDP
@@ -107,9 +156,16 @@ class IDPReadOnlySerializer(serializers.ModelSerializer):
             "employee",
             "notifications",
             "tasks",
+            "progress",
         )
 
 
+class IDPTasksPageSerializer(IDPReadOnlySerializer):
+    """Сериализатор для чтения IDP со страницей задач вместо всех задач."""
+
+    tasks = TaskAsFieldSerializer(many=True, source="page_tasks")
+
+
 class CreateIDPSerializer(serializers.ModelSerializer):
     """Сериализатор для создания IDP."""
 
@@ -150,7 +206,7 @@ class CreateIDPSerializer(serializers.ModelSerializer):
 
 
 class FileSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания File."""
+    """Сериализатор для создания и замены File."""
 
     class Meta:
         model = File
@@ -159,7 +215,9 @@ class FileSerializer(serializers.ModelSerializer):
             "file",
             "file_name",
             "file_type",
+            "file_task",
         )
+        extra_kwargs = {"file_task": {"required": True}}
 
     def validate(self, data):
         extensions, content_types = get_extensions()
@@ -177,6 +235,53 @@ class FileSerializer(serializers.ModelSerializer):
         uploaded_file = validated_data.get("file")
         file_name = uploaded_file.name
         content_type = uploaded_file.content_type
-        return File.objects.create(
-            file=uploaded_file, file_name=file_name, file_type=content_type
+        file_obj = File(
+            file_name=file_name,
+            file_type=content_type,
+            file_task=validated_data["file_task"],
+        )
+        store_file(file_obj, uploaded_file)
+        return file_obj
+
+    def update(self, instance, validated_data):
+        uploaded_file = validated_data.pop("file", None)
+        if uploaded_file is None:
+            return super().update(instance, validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.file_name = uploaded_file.name
+        instance.file_type = uploaded_file.content_type
+        # прежний Blob освобождается в store_file после коммита
+        store_file(instance, uploaded_file)
+        return instance
+
+
+class FileUploadSerializer(serializers.ModelSerializer):
+    """Сериализатор загрузки файла частями."""
+
+    size = serializers.IntegerField(min_value=1, max_value=UPLOAD_MAX_SIZE)
+
+    class Meta:
+        model = FileUpload
+        fields = (
+            "upload_id",
+            "file_task",
+            "file_name",
+            "file_type",
+            "size",
+            "offset",
+            "sha256",
         )
+        read_only_fields = ("upload_id", "offset")
+
+    def validate(self, data):
+        extensions, content_types = get_extensions()
+        file_name = data["file_name"].lower()
+        if data.get("file_type") not in content_types or not any(
+            file_name.endswith(extension) for extension in extensions
+        ):
+            raise serializers.ValidationError(
+                f"Непопустимый формат файла. "
+                f"Допустимые расширения: {', '.join(extensions)}"
+            )
+        return data
@@ -1,6 +1,4 @@
 import logging
-from itertools import chain
-from typing import Any, Dict, List
 
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
@@ -9,7 +7,6 @@ from rest_framework import serializers
 from users.models import Department, Position, User
 
 from .fields import IDPasFieldSerializer, UserAsFieldSerializer
-from .idp_app import IDPNotificationSerializer, TaskNotificationSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +23,6 @@ class UserSerializer(serializers.ModelSerializer):
         slug_field="dep_name", queryset=Department.objects.all()
     )
     idps = IDPasFieldSerializer(many=True)
-    notifications = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -42,18 +38,8 @@ class UserSerializer(serializers.ModelSerializer):
             "mentor_tasks",
             "idps",
             "subordinates",
-            "notifications",
         )
 
-    def get_notifications(self, obj: User) -> List[Dict[str, Any]]:
-        """Объединяет уведомления по таскам и по ипр."""
-        task_notes = obj.task_notices.all()
-        idp_notes = obj.idp_notices.all()
-        task_data = TaskNotificationSerializer(task_notes, many=True).data
-        idp_data = IDPNotificationSerializer(idp_notes, many=True).data
-        union_list = list(chain(task_data, idp_data))
-        return union_list
-
 
 class UserCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создния объектов User."""
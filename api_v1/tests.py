@@ -0,0 +1,904 @@
+import hashlib
+import io
+import os
+import random
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.models.functions import Lower
+from django.test import AsyncClient, Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import (
+    APIClient,
+    APIRequestFactory,
+    force_authenticate,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api_v1.pagination import KeysetPagination, UnionKeysetPagination
+from api_v1.views.idp_app import XLSX_CONTENT_TYPE, IDPViewSet, TaskViewSet
+from api_v1.views.users import UserViewSet
+from core.choices import IdpStatuses, NotificationStatuses, TaskStatuses
+from core.constants import EXPORT_EXPIRE_HOURS
+from idp_app import pubsub
+from idp_app.blobs import get_blob_name, write_temp_blob
+from idp_app.exports import purge_stale_exports, start_subordinates_export
+from idp_app.models import (
+    IDP,
+    Blob,
+    File,
+    FileUpload,
+    IdpExport,
+    IdpNotification,
+    Notification,
+    Task,
+    TaskNotification,
+)
+from idp_app.notifications import NOTIFICATION_CHANNEL, get_inbox_querysets
+from idp_app.pubsub import check_broker, publish
+from idp_app.uploads import UPLOAD_TMP_DIR, complete_upload, write_upload_chunk
+from users.models import User
+
+LAST_NAMES = ("Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов")
+SEED_BATCH_SIZE = 1000
+
+
+class QueryCountTestCase(TestCase):
+    """Базовый класс для проверки количества запросов эндпоинтов."""
+
+    def setUp(self):
+        cache.clear()
+        self.chief = User.objects.create(
+            email="chief@example.com", first_name="Р", last_name="Руков"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.chief)
+
+    def get_over_asgi(self, url: str, **headers):
+        """
+        Выполняет GET через ASGI и читает тело ответа целиком.
+
+        Синхронный код запроса выполняется в этом потоке, поэтому
+        его запросы к БД видит assertNumQueries.
+        """
+        token = AccessToken.for_user(self.chief)
+
+        async def get():
+            response = await AsyncClient().get(
+                url, headers={"Authorization": f"Bearer {token}", **headers}
+            )
+            if not response.streaming:
+                return response, response.content
+            # синхронный итератор ASGI-обработчик собрал бы в память
+            self.assertTrue(response.is_async)
+            parts = [part async for part in response.streaming_content]
+            return response, b"".join(parts)
+
+        return async_to_sync(get)()
+
+    def create_employee(self, number: int) -> User:
+        return User.objects.create(
+            email=f"employee-{number}@example.com",
+            first_name="С",
+            last_name=f"Сотрудник{number}",
+            chief=self.chief,
+        )
+
+    def create_idp(self, employee: User, tasks_count: int = 0) -> IDP:
+        idp = IDP.objects.create(
+            name=f"ИПР {employee.last_name}",
+            employee=employee,
+            status=IdpStatuses.ACTIVE,
+        )
+        for number in range(tasks_count):
+            Task.objects.create(
+                task_name=f"Задача {number}",
+                task_description="-",
+                task_mentor=self.chief,
+                idp=idp,
+            )
+        return idp
+
+
+class TaskListQueriesTest(QueryCountTestCase):
+    """Список задач ИПР загружается фиксированным числом запросов."""
+
+    def get_tasks(self, idp: IDP):
+        response = self.client.get(f"/api/v1/idp/{idp.pk}/tasks/")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_queries_do_not_depend_on_tasks_count(self):
+        employee = self.create_employee(1)
+        for tasks_count in (1, 20):
+            idp = self.create_idp(employee, tasks_count)
+            with self.assertNumQueries(3):
+                response = self.get_tasks(idp)
+            self.assertEqual(len(response.data["tasks"]), tasks_count)
+
+
+class IdpListQueriesTest(QueryCountTestCase):
+    """Списки ИПР загружаются фиксированным числом запросов."""
+
+    PAGE_SIZES = (10, 100)
+
+    def setUp(self):
+        super().setUp()
+        for number in range(max(self.PAGE_SIZES)):
+            employee = self.create_employee(number)
+            self.create_idp(employee, tasks_count=2)
+        for number in range(max(self.PAGE_SIZES)):
+            IDP.objects.create(name=f"Личный {number}", employee=self.chief)
+
+    def assert_page_queries(self, url: str, queries: int):
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size), mock.patch.object(
+                KeysetPagination, "page_size", page_size
+            ):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_list(self):
+        self.assert_page_queries("/api/v1/idp/", 4)
+
+    def test_private(self):
+        self.assert_page_queries("/api/v1/idp/private/", 4)
+
+    def test_subordinates(self):
+        self.assert_page_queries("/api/v1/idp/subordinates/", 5)
+
+
+class UserListQueriesTest(QueryCountTestCase):
+    """Список пользователей загружается фиксированным числом запросов."""
+
+    # пользователь по JWT, список и три prefetch, для страницы еще COUNT
+    FORMAT_QUERIES = {"json": 6, "csv": 5, "ndjson": 5}
+
+    def get_users(self, format: str):
+        response, body = self.get_over_asgi(f"/api/v1/users/?format={format}")
+        self.assertEqual(response.status_code, 200)
+        return body
+
+    def test_queries_do_not_depend_on_users_count(self):
+        created = 0
+        for users_count in (5, 50):
+            for number in range(created, users_count):
+                self.create_idp(self.create_employee(number), tasks_count=2)
+            created = users_count
+            for format, queries in self.FORMAT_QUERIES.items():
+                with self.subTest(format=format, users_count=users_count):
+                    with self.assertNumQueries(queries):
+                        self.get_users(format)
+
+
+class FileTestCase(QueryCountTestCase):
+    """Базовый класс для проверки файлов во временном MEDIA_ROOT."""
+
+    CONTENT = b"%PDF-content"
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = media_root.name
+        self.task = self.create_idp(self.create_employee(1), 1).tasks.get()
+
+    def post_file(self, **data):
+        data["file"] = SimpleUploadedFile(
+            "plan.pdf", self.CONTENT, content_type="application/pdf"
+        )
+        return self.client.post("/api/v1/file/", data, format="multipart")
+
+    def get_blob_path(self) -> str:
+        digest = hashlib.sha256(self.CONTENT).hexdigest()
+        return os.path.join(self.media_root, get_blob_name(digest))
+
+
+class FileCreateTest(FileTestCase):
+    """Создание и замена файла, освобождение его Blob."""
+
+    def test_file_task_is_required(self):
+        response = self.post_file()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file_task", response.data)
+        self.assertFalse(os.path.exists(self.get_blob_path()))
+
+    def test_blob_file_is_removed_on_rollback(self):
+        with mock.patch.object(File, "save", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.post_file(file_task=self.task.pk)
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(self.get_blob_path()))
+
+    def test_blob_is_released_with_last_file(self):
+        for _ in range(2):
+            response = self.post_file(file_task=self.task.pk)
+            self.assertEqual(response.status_code, 201)
+        files = list(File.objects.all())
+        with self.captureOnCommitCallbacks(execute=True):
+            files[0].delete()
+        self.assertEqual(Blob.objects.get().refs, 1)
+        self.assertTrue(os.path.exists(self.get_blob_path()))
+        with self.captureOnCommitCallbacks(execute=True):
+            files[1].delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(self.get_blob_path()))
+
+    def test_patch_replaces_blob(self):
+        for _ in range(2):
+            file_id = self.post_file(file_task=self.task.pk).data["file_id"]
+        old_blob = Blob.objects.get()
+        content = b"%PDF-new-content"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/v1/file/{file_id}/",
+                {
+                    "file": SimpleUploadedFile(
+                        "new.pdf", content, content_type="application/pdf"
+                    )
+                },
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 200)
+        digest = hashlib.sha256(content).hexdigest()
+        file_obj = File.objects.get(pk=file_id)
+        self.assertEqual(file_obj.blob_id, digest)
+        self.assertEqual(file_obj.file.name, get_blob_name(digest))
+        self.assertEqual(file_obj.file_name, "new.pdf")
+        self.assertEqual(Blob.objects.get(pk=digest).refs, 1)
+        old_blob.refresh_from_db()
+        self.assertEqual(old_blob.refs, 1)
+
+
+class FileDownloadTest(FileTestCase):
+    """Скачивание файла асинхронным потоком."""
+
+    def setUp(self):
+        super().setUp()
+        response = self.post_file(file_task=self.task.pk)
+        self.url = f"/api/v1/download/{response.data['file_id']}/"
+
+    def test_full_download(self):
+        response, body = self.get_over_asgi(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.CONTENT)
+        self.assertEqual(response["Content-Length"], str(len(self.CONTENT)))
+
+    def test_range_download(self):
+        response, body = self.get_over_asgi(self.url, Range="bytes=1-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.CONTENT[1:5])
+        self.assertEqual(
+            response["Content-Range"], f"bytes 1-4/{len(self.CONTENT)}"
+        )
+
+
+class ExportDownloadTest(FileTestCase):
+    """Скачивание файла фонового экспорта ИПР."""
+
+    def test_export_file_is_streamed(self):
+        export_id = start_subordinates_export(self.chief.pk)
+        response, body = self.get_over_asgi(
+            f"/api/v1/idp/export/excel/{export_id}/"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], XLSX_CONTENT_TYPE)
+        self.assertEqual(response["Content-Length"], str(len(body)))
+        self.assertTrue(body.startswith(b"PK"))
+
+    def test_stale_export_is_purged(self):
+        export_id = start_subordinates_export(self.chief.pk)
+        export = IdpExport.objects.get(pk=export_id)
+        path = export.file.path
+        self.assertTrue(os.path.exists(path))
+        IdpExport.objects.filter(pk=export_id).update(
+            created=timezone.now()
+            - timedelta(hours=EXPORT_EXPIRE_HOURS, minutes=1)
+        )
+        self.assertEqual(purge_stale_exports(), 1)
+        self.assertFalse(IdpExport.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        response = self.client.get(f"/api/v1/idp/export/excel/{export_id}/")
+        self.assertEqual(response.status_code, 404)
+
+
+class FileUploadTest(FileTestCase):
+    """Загрузка файла частями."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = os.path.join(self.media_root, UPLOAD_TMP_DIR)
+        response = self.client.post(
+            "/api/v1/file/uploads/",
+            {
+                "file_task": self.task.pk,
+                "file_name": "plan.pdf",
+                "file_type": "application/pdf",
+                "size": len(self.CONTENT),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.upload_id = response.data["upload_id"]
+        self.upload_url = f"/api/v1/file/uploads/{self.upload_id}/"
+
+    def put_chunk(self, offset: int, data: bytes):
+        return self.client.generic(
+            "PUT",
+            f"{self.upload_url}?offset={offset}",
+            data,
+            content_type="application/octet-stream",
+        )
+
+    def assert_no_tmp_parts(self):
+        tmp_dir = self.tmp_dir.format(self.upload_id)
+        if os.path.exists(tmp_dir):
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_stale_offset_is_rejected(self):
+        self.assertEqual(self.put_chunk(0, self.CONTENT[:4]).status_code, 200)
+        response = self.put_chunk(0, self.CONTENT[:4])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["offset"], 4)
+        self.assert_no_tmp_parts()
+
+    def test_upload_completes_once(self):
+        self.assertEqual(self.put_chunk(0, self.CONTENT).status_code, 200)
+        response = self.client.post(f"{self.upload_url}complete/")
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(f"{self.upload_url}complete/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_parts_are_hashed_outside_transaction(self):
+        self.put_chunk(0, self.CONTENT)
+        savepoints = len(connection.savepoint_ids)
+
+        def write_parts(content):
+            self.assertEqual(len(connection.savepoint_ids), savepoints)
+            self.assertTrue(
+                FileUpload.objects.get(pk=self.upload_id).completing
+            )
+            response = self.client.post(f"{self.upload_url}complete/")
+            self.assertEqual(response.status_code, 409)
+            response = self.put_chunk(len(self.CONTENT), b"x")
+            self.assertEqual(response.status_code, 409)
+            return write_temp_blob(content)
+
+        with mock.patch(
+            "idp_app.uploads.write_temp_blob", side_effect=write_parts
+        ):
+            file_obj, digest = complete_upload(self.upload_id)
+        self.assertEqual(digest, hashlib.sha256(self.CONTENT).hexdigest())
+        self.assertFalse(FileUpload.objects.exists())
+        self.assertEqual(File.objects.get().pk, file_obj.pk)
+
+    def test_checksum_mismatch_allows_retry(self):
+        self.put_chunk(0, self.CONTENT)
+        FileUpload.objects.filter(pk=self.upload_id).update(sha256="0" * 64)
+        response = self.client.post(f"{self.upload_url}complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FileUpload.objects.get(pk=self.upload_id).completing)
+        FileUpload.objects.filter(pk=self.upload_id).update(
+            sha256=hashlib.sha256(self.CONTENT).hexdigest()
+        )
+        response = self.client.post(f"{self.upload_url}complete/")
+        self.assertEqual(response.status_code, 201)
+        self.assert_no_tmp_parts()
+
+    def test_complete_deleted_upload(self):
+        self.put_chunk(0, self.CONTENT)
+        FileUpload.objects.filter(pk=self.upload_id).delete()
+        with self.assertRaises(FileUpload.DoesNotExist):
+            complete_upload(self.upload_id)
+        self.assertFalse(File.objects.exists())
+
+    def test_chunk_for_deleted_upload(self):
+        upload = FileUpload.objects.get(pk=self.upload_id)
+        FileUpload.objects.filter(pk=self.upload_id).delete()
+        with self.assertRaises(FileUpload.DoesNotExist):
+            write_upload_chunk(
+                upload, 0, io.BytesIO(self.CONTENT), len(self.CONTENT)
+            )
+        self.assert_no_tmp_parts()
+
+
+class NotificationEventsTest(QueryCountTestCase):
+    """Поток уведомлений SSE отдается только через ASGI."""
+
+    def get_url(self) -> str:
+        token = AccessToken.for_user(self.chief)
+        return f"/api/v1/users/me/events/?token={token}"
+
+    def test_wsgi_is_refused(self):
+        response = Client().get(self.get_url())
+        self.assertEqual(response.status_code, 501)
+
+    async def test_asgi_streams_events(self):
+        response = await AsyncClient().get(self.get_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b": connected\n\n")
+        publish(NOTIFICATION_CHANNEL.format(self.chief.pk), "test", {"a": 1})
+        self.assertEqual(
+            await anext(chunks), b'event: test\ndata: {"a": 1}\n\n'
+        )
+
+    def test_local_broker_with_celery_is_reported(self):
+        with mock.patch.multiple(
+            pubsub, PUBSUB_URL=None, INCLUDE_CELERY="True"
+        ):
+            with self.assertLogs("idp_app.pubsub", "WARNING"):
+                check_broker()
+        with mock.patch.object(pubsub, "PUBSUB_URL", "redis://redis"):
+            with self.assertNoLogs("idp_app.pubsub", "WARNING"):
+                check_broker()
+
+
+class IdpOrderingTest(QueryCountTestCase):
+    """Сортировка ИПР по статусу в обычном и курсорном режимах."""
+
+    STATUSES = (
+        IdpStatuses.DRAFT,
+        IdpStatuses.ACTIVE,
+        IdpStatuses.DRAFT,
+        IdpStatuses.CLOSED,
+        IdpStatuses.OVERDUE,
+    )
+
+    def setUp(self):
+        super().setUp()
+        for number, idp_status in enumerate(self.STATUSES):
+            IDP.objects.create(
+                name=f"ИПР {number}", employee=self.chief, status=idp_status
+            )
+
+    def get_statuses(self, ordering: str):
+        response = self.client.get(f"/api/v1/idp/?ordering={ordering}")
+        return [idp["status"] for idp in response.data["results"]]
+
+    def walk_cursor(self, ordering: str):
+        """Проходит все страницы вперед и возвращает ИПР по порядку."""
+        url = f"/api/v1/idp/?ordering={ordering}&pagination=cursor"
+        idps, pages = [], []
+        with mock.patch.object(KeysetPagination, "page_size", 2):
+            while url:
+                response = self.client.get(url)
+                pages.append(response.data["results"])
+                idps.extend(idp["idp_id"] for idp in response.data["results"])
+                url = response.data["next"]
+            previous = response.data["previous"]
+            while previous:
+                pages.pop()
+                response = self.client.get(previous)
+                self.assertEqual(response.data["results"], pages[-1])
+                previous = response.data["previous"]
+        return idps
+
+    def test_drafts_go_last(self):
+        for ordering in ("status", "-status"):
+            with self.subTest(ordering=ordering):
+                statuses = self.get_statuses(ordering)
+                self.assertEqual(statuses[-2:], [IdpStatuses.DRAFT] * 2)
+        self.assertEqual(
+            self.get_statuses("-status")[:3],
+            [IdpStatuses.CLOSED, IdpStatuses.OVERDUE, IdpStatuses.ACTIVE],
+        )
+
+    def test_cursor_walk_matches_page_order(self):
+        for ordering in ("status,name", "-status,name"):
+            with self.subTest(ordering=ordering):
+                response = self.client.get(f"/api/v1/idp/?ordering={ordering}")
+                expected = [idp["idp_id"] for idp in response.data["results"]]
+                self.assertEqual(self.walk_cursor(ordering), expected)
+
+    def test_unsupported_ordering_is_rejected(self):
+        queryset = IDP.objects.order_by(Lower("name"))
+        with self.assertRaises(ImproperlyConfigured):
+            KeysetPagination().get_ordering(queryset)
+
+    def test_malformed_cursor_values(self):
+        for values in (["ИПР", "not-a-uuid"], ["ИПР", {"pk": 1}]):
+            with self.subTest(values=values):
+                cursor = KeysetPagination().encode_cursor(values, False)
+                response = self.client.get(
+                    f"/api/v1/idp/?ordering=name&cursor={cursor}"
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+class EndDateFilterTest(QueryCountTestCase):
+    """Фильтр по сроку: фактическому для выполненных, плановому для прочих."""
+
+    def setUp(self):
+        super().setUp()
+        inside = timezone.now() + timedelta(days=30)
+        outside = inside + timedelta(days=30)
+        self.dates = (inside.date(), (inside + timedelta(days=1)).date())
+        self.task_idp = IDP.objects.create(
+            name="Задачи", employee=self.chief, end_date_plan=outside
+        )
+        self.idps, self.tasks = {}, {}
+        for name, closed, plan, fact in (
+            ("active_in", False, inside, None),
+            ("active_out", False, outside, None),
+            ("closed_in", True, outside, inside),
+            ("closed_out", True, inside, outside),
+        ):
+            self.idps[name] = IDP.objects.create(
+                name=name,
+                employee=self.chief,
+                status=IdpStatuses.CLOSED if closed else IdpStatuses.ACTIVE,
+                end_date_plan=plan,
+                end_date_fact=fact,
+            ).pk
+            self.tasks[name] = Task.objects.create(
+                task_name=name,
+                task_description="-",
+                task_status=(
+                    TaskStatuses.CLOSED if closed else TaskStatuses.ACTIVE
+                ),
+                task_end_date_plan=plan,
+                task_end_date_fact=fact,
+                idp=self.task_idp,
+            ).pk
+
+    def get_filtered(self, url: str) -> list:
+        start, stop = self.dates
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f"{url}?end_date_after={start}&end_date_before={stop}"
+            )
+        self.assertEqual(response.status_code, 200)
+        sql = "\n".join(query["sql"] for query in context.captured_queries)
+        self.assertIn("end_date_effective", sql)
+        self.assertNotIn("UNION", sql)
+        return response.data
+
+    def test_idps_are_filtered_by_effective_date(self):
+        data = self.get_filtered("/api/v1/idp/")
+        self.assertEqual(
+            sorted(idp["idp_id"] for idp in data["results"]),
+            sorted(
+                str(self.idps[name]) for name in ("active_in", "closed_in")
+            ),
+        )
+
+    def test_tasks_are_filtered_by_effective_date(self):
+        data = self.get_filtered(f"/api/v1/idp/{self.task_idp.pk}/tasks/")
+        self.assertEqual(
+            sorted(task["task_id"] for task in data["tasks"]),
+            sorted([self.tasks["active_in"], self.tasks["closed_in"]]),
+        )
+
+
+class InboxTest(QueryCountTestCase):
+    """Общий список уведомлений по ИПР и задачам."""
+
+    URL = "/api/v1/users/me/notifications/"
+
+    def setUp(self):
+        super().setUp()
+        idp = self.create_idp(self.create_employee(1), tasks_count=5)
+        notification = Notification.objects.create(name="Уведомление")
+        self.idp_notes = IdpNotification.objects.bulk_create(
+            IdpNotification(
+                notification=notification, idp=idp, receiver=self.chief
+            )
+            for _ in range(5)
+        )
+        self.task_notes = TaskNotification.objects.bulk_create(
+            TaskNotification(
+                notification=notification, task=task, receiver=self.chief
+            )
+            for task in idp.tasks.all()
+        )
+        # чужое уведомление не попадает в список и не отмечается
+        self.other_note = IdpNotification.objects.create(
+            notification=notification, idp=idp, receiver=idp.employee
+        )
+        # у первых трех уведомлений каждой таблицы одинаковое время
+        now = timezone.now()
+        for offset, idp_note, task_note in zip(
+            (0, 0, 0, 1, -1), self.idp_notes, self.task_notes
+        ):
+            for note in (idp_note, task_note):
+                note.date = now + timedelta(seconds=offset)
+                type(note).objects.filter(pk=note.pk).update(date=note.date)
+
+    def get_expected(self):
+        notes = sorted(
+            (
+                (note.date, kind, note.pk)
+                for kind, notes in (
+                    ("idp", self.idp_notes),
+                    ("task", self.task_notes),
+                )
+                for note in notes
+            ),
+            reverse=True,
+        )
+        return [(kind, pk) for _, kind, pk in notes]
+
+    def get_keys(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [
+            (note["kind"], note["id"]) for note in response.data["results"]
+        ]
+
+    def test_union_is_ordered_by_date_and_kind(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(self.get_keys(response), self.get_expected())
+
+    def test_cursor_walk_with_equal_dates(self):
+        url, pages = f"{self.URL}?pagination=cursor", []
+        with mock.patch.object(UnionKeysetPagination, "page_size", 2):
+            while url:
+                response = self.client.get(url)
+                pages.append(self.get_keys(response))
+                url = response.data["next"]
+            self.assertEqual(sum(pages, []), self.get_expected())
+            previous = response.data["previous"]
+            while previous:
+                pages.pop()
+                response = self.client.get(previous)
+                self.assertEqual(self.get_keys(response), pages[-1])
+                previous = response.data["previous"]
+        self.assertEqual(len(pages), 1)
+
+    def test_status_filter(self):
+        IdpNotification.objects.filter(pk=self.idp_notes[0].pk).update(
+            status=NotificationStatuses.READ
+        )
+        response = self.client.get(
+            f"{self.URL}?status={NotificationStatuses.READ}"
+        )
+        self.assertEqual(
+            self.get_keys(response), [("idp", self.idp_notes[0].pk)]
+        )
+
+    def test_malformed_cursor_values(self):
+        for values in (
+            [{"date": 1}, "idp", 1],
+            ["not-a-date", "idp", 1],
+            [timezone.now(), "task", "not-a-pk"],
+        ):
+            with self.subTest(values=values):
+                cursor = UnionKeysetPagination().encode_cursor(values, False)
+                response = self.client.get(f"{self.URL}?cursor={cursor}")
+                self.assertEqual(response.status_code, 404)
+
+    def assert_updates(self, url: str, data: dict, tables: list):
+        """Проверяет, что каждая таблица обновлена одним UPDATE."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        updates = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), len(tables))
+        for sql, model in zip(updates, tables):
+            self.assertIn(model._meta.db_table, sql)
+        return response.data
+
+    def test_read_all(self):
+        data = self.assert_updates(
+            f"{self.URL}read-all/", {}, [IdpNotification, TaskNotification]
+        )
+        self.assertEqual(data, {"idp": 5, "task": 5, "total": 10})
+        self.other_note.refresh_from_db()
+        self.assertEqual(self.other_note.status, NotificationStatuses.UNREAD)
+
+    def test_read_by_ids_updates_only_given_table(self):
+        ids = [note.pk for note in self.idp_notes[:2]] + [self.other_note.pk]
+        data = self.assert_updates(
+            f"{self.URL}read/", {"idp": ids}, [IdpNotification]
+        )
+        self.assertEqual(data, {"idp": 2, "task": 0, "total": 2})
+
+    def test_read_before(self):
+        before = self.idp_notes[0].date
+        data = self.assert_updates(
+            f"{self.URL}read-before/",
+            {"before": before.isoformat()},
+            [IdpNotification, TaskNotification],
+        )
+        self.assertEqual(data, {"idp": 1, "task": 1, "total": 2})
+
+
+@skipUnless(connection.vendor == "postgresql", "Планы запросов PostgreSQL")
+class QueryPlanTest(TestCase):
+    """
+    Проверяет через EXPLAIN, что запросы эндпоинтов используют индексы.
+
+    Querysets строятся самими вьюсетами, как при обработке запроса.
+    """
+
+    EMPLOYEES_COUNT = 1000
+    PAGE_SIZE = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        chiefs = User.objects.bulk_create(
+            [
+                User(
+                    email=f"plan-chief-{number}@example.com",
+                    first_name="Руководитель",
+                    last_name=rnd.choice(LAST_NAMES),
+                )
+                for number in range(cls.EMPLOYEES_COUNT // 10)
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        employees = User.objects.bulk_create(
+            [
+                User(
+                    email=f"plan-employee-{number}@example.com",
+                    first_name="Сотрудник",
+                    last_name=f"{rnd.choice(LAST_NAMES)}{number}",
+                    chief=rnd.choice(chiefs),
+                )
+                for number in range(cls.EMPLOYEES_COUNT)
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        idps = IDP.objects.bulk_create(
+            [
+                IDP(
+                    name=f"ИПР {number}",
+                    employee=employee,
+                    status=rnd.choice(IdpStatuses.values),
+                )
+                for employee in employees
+                for number in range(5)
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        tasks = Task.objects.bulk_create(
+            [
+                Task(
+                    task_name=f"Задача {number}",
+                    task_description="Описание",
+                    task_status=rnd.choice(TaskStatuses.values),
+                    task_mentor=rnd.choice(chiefs),
+                    idp=idp,
+                )
+                for idp in idps
+                for number in range(3)
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        notification = Notification.objects.create(name="Уведомление")
+        statuses = (NotificationStatuses.READ,) * 9 + (
+            NotificationStatuses.UNREAD,
+        )
+        IdpNotification.objects.bulk_create(
+            [
+                IdpNotification(
+                    notification=notification,
+                    idp=idp,
+                    receiver_id=idp.employee_id,
+                    status=rnd.choice(statuses),
+                )
+                for idp in idps
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        TaskNotification.objects.bulk_create(
+            [
+                TaskNotification(
+                    notification=notification,
+                    task=task,
+                    receiver_id=task.task_mentor_id,
+                    status=rnd.choice(statuses),
+                )
+                for task in tasks
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        cls.chief, cls.employee = chiefs[0], employees[0]
+        cls.mentor = tasks[0].task_mentor
+        cls.idp = idps[0]
+        tables = ", ".join(
+            model._meta.db_table
+            for model in (User, IDP, Task, IdpNotification, TaskNotification)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {tables}")
+
+    def get_view(self, viewset, action: str, user: User, url="/", **kwargs):
+        """Возвращает вьюсет, подготовленный к обработке GET-запроса."""
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user)
+        view = viewset(action_map={"get": action}, format_kwarg=None)
+        view.setup(request, **kwargs)
+        view.request = view.initialize_request(request, **kwargs)
+        return view
+
+    def get_endpoint_queries(self):
+        """Возвращает запросы эндпоинтов и таблицы, которые они читают."""
+        idp_table = IDP._meta.db_table
+        page = slice(0, self.PAGE_SIZE)
+
+        idp_list = self.get_view(IDPViewSet, "list", self.chief)
+        private = self.get_view(IDPViewSet, "get_private_idps", self.employee)
+        subordinates = self.get_view(
+            IDPViewSet, "get_subordinates_idps", self.chief
+        )
+        idp_tasks = self.get_view(
+            TaskViewSet,
+            "list",
+            self.employee,
+            f"/?task_status={TaskStatuses.ACTIVE}",
+            idp_id=str(self.idp.pk),
+        )
+        user_search = self.get_view(
+            UserViewSet,
+            "list",
+            self.chief,
+            f"/?search={self.employee.last_name}",
+        )
+        inbox = UnionKeysetPagination()
+        inbox.page_size = self.PAGE_SIZE
+        inbox_parts = get_inbox_querysets(
+            self.mentor, NotificationStatuses.UNREAD
+        )
+        return {
+            "idp_list": (
+                idp_list.filter_queryset(idp_list.get_queryset())[page],
+                (idp_table,),
+            ),
+            "idp_private": (
+                private.filter_queryset(private.get_private_queryset())[page],
+                (idp_table,),
+            ),
+            "idp_subordinates": (
+                subordinates.filter_queryset(
+                    subordinates.get_subordinates_queryset()
+                )[page],
+                (idp_table,),
+            ),
+            "idp_tasks": (
+                idp_tasks.filter_queryset(idp_tasks.get_queryset()),
+                (Task._meta.db_table,),
+            ),
+            "mentor_tasks": (
+                self.mentor.mentor_tasks.all(),
+                (Task._meta.db_table,),
+            ),
+            "inbox_unread": (
+                inbox.get_union(inbox_parts, None, False)[
+                    : self.PAGE_SIZE + 1
+                ],
+                (
+                    IdpNotification._meta.db_table,
+                    TaskNotification._meta.db_table,
+                ),
+            ),
+            "user_search": (
+                user_search.filter_queryset(user_search.get_queryset())[page],
+                (User._meta.db_table,),
+            ),
+        }
+
+    def test_endpoint_queries_use_indexes(self):
+        for name, (queryset, tables) in self.get_endpoint_queries().items():
+            plan = queryset.explain()
+            for table in tables:
+                with self.subTest(name, table=table):
+                    self.assertNotIn(f"Seq Scan on {table}", plan, plan)
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api_v1.views.events import notification_events
 from api_v1.views.idp_app import (
     DepartmentViewSet,
     FileViewSet,
@@ -33,6 +34,11 @@ router.register("users", UserViewSet, basename="users")
 
 
 urlpatterns = [
+    path(
+        "v1/users/me/events/",
+        notification_events,
+        name="notification_events",
+    ),
     path("v1/", include(router.urls)),
     path("v1/", include("djoser.urls")),
     path("v1/auth/", include("djoser.urls.jwt")),
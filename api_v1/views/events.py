@@ -0,0 +1,80 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from core.constants import SSE_KEEPALIVE_INTERVAL
+from idp_app.notifications import NOTIFICATION_CHANNEL
+from idp_app.pubsub import get_broker
+
+logger = logging.getLogger(__name__)
+
+
+def authenticate(request):
+    """
+    Возвращает пользователя по JWT или None.
+
+    EventSource в браузере не умеет передавать заголовки, поэтому
+    токен можно передать и в параметре ?token=.
+    """
+    authentication = JWTAuthentication()
+    try:
+        result = authentication.authenticate(request)
+        if result is not None:
+            return result[0]
+        raw_token = request.GET.get("token")
+        if raw_token is None:
+            return None
+        token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(token)
+    except (InvalidToken, TokenError):
+        return None
+
+
+async def stream_notifications(channel: str):
+    """Отдает события SSE из канала pub/sub, пока клиент подключен."""
+    async with get_broker().subscribe(channel) as receive:
+        # комментарий сразу отправляет заголовки клиенту
+        yield ": connected\n\n"
+        while True:
+            message = await receive(SSE_KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                event, data = message.split("\n", 1)
+                yield f"event: {event}\ndata: {data}\n\n"
+
+
+async def notification_events(request):
+    """
+    Поток новых уведомлений авторизованного пользователя (SSE).
+
+    Событие notification содержит уведомление в том же виде,
+    что и элемент списка /users/me/notifications/. Имя события
+    передается в сообщении pub/sub, поэтому в этот же поток
+    могут писать и другие части проекта.
+    Работает только под ASGI: под WSGI бесконечный поток
+    занял бы синхронный воркер на все время подключения.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "Поток событий доступен только через ASGI."},
+            status=501,
+        )
+    user = await sync_to_async(authenticate)(request)
+    if user is None or not user.is_active:
+        return JsonResponse(
+            {"detail": "Учетные данные не были предоставлены."}, status=401
+        )
+    logger.info(f"User {user.pk} subscribed to notifications")
+    response = StreamingHttpResponse(
+        stream_notifications(NOTIFICATION_CHANNEL.format(user.pk)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx не должен буферизовать поток
+    response["X-Accel-Buffering"] = "no"
+    return response
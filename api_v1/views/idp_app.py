@@ -1,17 +1,20 @@
 import logging
 
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from api_v1.downloads import get_file_response, serve_file
 from api_v1.filters import (
     IdpFilterSet,
     IdpOrderingFilter,
@@ -26,27 +29,51 @@ from api_v1.serializers.idp_app import (
     CreateIDPSerializer,
     DepartmentSerializer,
     FileSerializer,
+    FileUploadSerializer,
     IDPNotificationSerializer,
     IDPReadOnlySerializer,
+    IDPTasksPageSerializer,
     NotificationSerializer,
     TaskNotificationSerializer,
     TaskSerializer,
 )
-from core.choices import IdpStatuses
-from core.utils import get_idp_extra_info, idp_status_order, setup_excel_file
+from api_v1.views.mixins import StreamingListMixin
+from core.choices import ExportStatuses, IdpStatuses
+from core.constants import (
+    EXCEL_EXPORT_SYNC_LIMIT,
+    IDP_LIST_ORDERING,
+    UPLOAD_CHUNK_MAX_SIZE,
+)
+from core.utils import (
+    get_idp_extra_info,
+    get_idps_export_rows,
+    write_idps_excel,
+)
+from idp_app.exports import (
+    get_export,
+    get_subordinates_idps,
+    start_subordinates_export,
+)
 from idp_app.models import (
     IDP,
     File,
+    FileUpload,
     IdpNotification,
     Notification,
     Task,
     TaskNotification,
 )
+from idp_app.uploads import UploadConflict, complete_upload, write_upload_chunk
 from users.models import Department
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+XLSX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
+EXPORT_FILE_NAME = "subordinates_idps.xlsx"
+
 
 class DepartmentViewSet(viewsets.ModelViewSet):
     queryset = Department.objects.all()
@@ -54,7 +81,7 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = (IsAuthenticated,)
@@ -75,18 +102,41 @@ class TaskViewSet(viewsets.ModelViewSet):
 
     @extend_schema(responses=IDPReadOnlySerializer)
     def list(self, request, *args, **kwargs):
-        tasks = self.get_queryset()
-        idp_id = self.kwargs.get("idp_id")
-        idp = get_object_or_404(IDP, pk=idp_id)
-        idp_data = IDPReadOnlySerializer(instance=idp).data
-        if not tasks:
-            return Response(data=idp_data)
-        filtered_tasks = self.filter_queryset(tasks)
-        tasks_data = TaskAsFieldSerializer(
-            instance=filtered_tasks, many=True
+        """
+        Возвращает ИПР с отфильтрованным списком его задач.
+
+        Задачи подгружаются в ИПР через Prefetch, поэтому запрос
+        не зависит от количества задач.
+        """
+        tasks = self.filter_queryset(self.get_queryset())
+        if self.is_streaming_request():
+            return self.get_streaming_response(tasks)
+        if self.paginator.is_cursor_request(request):
+            return self.list_tasks_page(tasks)
+        idp = get_object_or_404(
+            IDP.objects.prefetch_related(
+                "notifications", Prefetch("tasks", queryset=tasks)
+            ),
+            pk=self.kwargs.get("idp_id"),
+        )
+        serializer = IDPReadOnlySerializer(
+            instance=idp, context=self.get_serializer_context()
+        )
+        return Response(data=serializer.data)
+
+    def list_tasks_page(self, tasks):
+        """Возвращает ИПР с одной страницей задач в курсорном режиме."""
+        idp = get_object_or_404(
+            IDP.objects.prefetch_related("notifications"),
+            pk=self.kwargs.get("idp_id"),
+        )
+        idp.page_tasks = self.paginate_queryset(tasks)
+        data = IDPTasksPageSerializer(
+            instance=idp, context=self.get_serializer_context()
         ).data
-        idp_data["tasks"] = tasks_data
-        return Response(data=idp_data)
+        data["next"] = self.paginator.get_next_link()
+        data["previous"] = self.paginator.get_previous_link()
+        return Response(data=data)
 
 
 class FileViewSet(viewsets.ModelViewSet):
@@ -95,15 +145,90 @@ class FileViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
 
     def download_file(self, request, file_id):
+        """Отдает файл потоком, с поддержкой Range и ETag."""
         file_obj = get_object_or_404(File, pk=file_id)
-        file_content = file_obj.file.read()
-        response = HttpResponse(
-            file_content, content_type="application/octet-stream"
+        return serve_file(request, file_obj.file, file_obj.file_name)
+
+    @extend_schema(
+        request=FileUploadSerializer, responses=FileUploadSerializer
+    )
+    @action(methods=["post"], detail=False, url_path="uploads")
+    def start_upload(self, request: Request):
+        """
+        Начинает загрузку файла частями.
+
+        Дальше части отправляются PUT-запросами на uploads/<upload_id>/
+        с ?offset= и байтами части в теле, затем загрузка завершается
+        POST-запросом на uploads/<upload_id>/complete/.
+        """
+        serializer = FileUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(owner=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(request=bytes, responses=FileUploadSerializer)
+    @action(
+        methods=["get", "put"],
+        detail=False,
+        url_path=r"uploads/(?P<upload_id>[0-9a-f-]{36})",
+    )
+    def upload_chunk(self, request: Request, upload_id: str):
+        """
+        Принимает часть файла или возвращает состояние загрузки.
+
+        offset в ответе - сколько байт уже получено, с этого места
+        загрузку можно продолжить после обрыва соединения.
+        """
+        upload = get_object_or_404(
+            FileUpload, pk=upload_id, owner=request.user
         )
-        response[
-            "Content-Disposition"
-        ] = f'attachment; filename="{file_obj.file.name}"'
-        return response
+        if request.method == "GET":
+            return Response(FileUploadSerializer(upload).data)
+        try:
+            offset = int(request.query_params["offset"])
+        except (KeyError, ValueError):
+            raise ValidationError({"offset": "Нужно указать смещение части."})
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if not 0 < length <= UPLOAD_CHUNK_MAX_SIZE:
+            raise ValidationError(
+                f"Размер части должен быть от 1 до {UPLOAD_CHUNK_MAX_SIZE}."
+            )
+        try:
+            upload = write_upload_chunk(upload, offset, request.stream, length)
+        except FileUpload.DoesNotExist as error:
+            raise NotFound(str(error))
+        except UploadConflict as error:
+            return Response(
+                {"detail": str(error), "offset": error.offset},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(FileUploadSerializer(upload).data)
+
+    @extend_schema(request=None, responses=FileSerializer)
+    @action(
+        methods=["post"],
+        detail=False,
+        url_path=r"uploads/(?P<upload_id>[0-9a-f-]{36})/complete",
+    )
+    def complete_upload(self, request: Request, upload_id: str):
+        """Собирает полученные части в файл и создает объект File."""
+        upload = get_object_or_404(
+            FileUpload, pk=upload_id, owner=request.user
+        )
+        try:
+            file_obj, digest = complete_upload(upload.pk)
+        except FileUpload.DoesNotExist as error:
+            raise NotFound(str(error))
+        except UploadConflict as error:
+            return Response(
+                {"detail": str(error), "offset": error.offset},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except ValueError as error:
+            raise ValidationError(str(error))
+        data = FileSerializer(file_obj).data
+        data["sha256"] = digest
+        return Response(data, status=status.HTTP_201_CREATED)
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
@@ -112,7 +237,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
 
 
-class IDPViewSet(viewsets.ModelViewSet):
+class IDPViewSet(StreamingListMixin, viewsets.ModelViewSet):
     queryset = IDP.objects.all()
     serializer_class = IDPReadOnlySerializer
     permission_classes = (IsAuthenticated,)
@@ -126,6 +251,35 @@ class IDPViewSet(viewsets.ModelViewSet):
         "employee__first_name",
     )
     filterset_class = IdpFilterSet
+    # действия, отдающие ИПР через IDPasFieldSerializer
+    short_list_actions = ("get_private_idps", "get_subordinates_idps")
+
+    def get_queryset(self):
+        """Подгружает связанные объекты, нужные сериализатору действия."""
+        queryset = super().get_queryset()
+        if self.action in self.short_list_actions:
+            return queryset.select_related("employee").only(
+                "idp_id",
+                "name",
+                "end_date_plan",
+                "status",
+                "tasks_total",
+                "tasks_closed",
+                "tasks_cancelled",
+                "employee__first_name",
+                "employee__last_name",
+            )
+        if self.request.method == "GET":
+            return queryset.prefetch_related(
+                "notifications",
+                Prefetch(
+                    "tasks",
+                    queryset=Task.objects.only(
+                        "idp", *TaskAsFieldSerializer.Meta.fields
+                    ),
+                ),
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method == "GET":
@@ -134,23 +288,8 @@ class IDPViewSet(viewsets.ModelViewSet):
 
     def filter_queryset(self, queryset):
         filtered_queryset = super().filter_queryset(queryset)
-        if self.request.query_params:
-            if not self.request.query_params.get("ordering"):
-                filtered_queryset.order_by(
-                    idp_status_order,
-                    "-end_date_plan",
-                    "employee__last_name",
-                    "employee__first_name",
-                    "name",
-                )
-        else:
-            filtered_queryset = filtered_queryset.order_by(
-                idp_status_order,
-                "-end_date_plan",
-                "employee__last_name",
-                "employee__first_name",
-                "name",
-            )
+        if not self.request.query_params.get("ordering"):
+            filtered_queryset = filtered_queryset.order_by(*IDP_LIST_ORDERING)
         return filtered_queryset
 
     def create(self, request, *args, **kwargs):
@@ -174,81 +313,116 @@ class IDPViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
+    def get_private_queryset(self):
+        """Возвращает личные ИПР авторизованного пользователя."""
+        return (
+            self.get_queryset()
+            .filter(employee=self.request.user)
+            .order_by("-end_date_plan")
+        )
+
+    def get_subordinates_queryset(self):
+        """Возвращает ИПР подчиненных без черновиков."""
+        return (
+            self.get_queryset()
+            .filter(employee__in=self.request.user.subordinates.all())
+            .exclude(status=IdpStatuses.DRAFT)
+        )
+
+    def get_idps_list_response(self, idps, empty_message: str):
+        """
+        Возвращает страницу ИПР с количеством ИПР по статусам.
+
+        Счетчики считаются одним агрегирующим запросом,
+        из базы загружается только запрошенная страница.
+        """
+        filtered_idps = self.filter_queryset(idps)
+        if self.is_streaming_request():
+            return self.get_streaming_response(
+                filtered_idps, IDPasFieldSerializer
+            )
+        if not filtered_idps.exists():
+            return Response({"detail": empty_message})
+        extra_info = get_idp_extra_info(filtered_idps)
+        page = self.paginate_queryset(filtered_idps)
+        if page is not None:
+            serializer = IDPasFieldSerializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = IDPasFieldSerializer(filtered_idps, many=True)
+            response = Response(data=serializer.data)
+
+        extra_info.update(response.data)
+        response.data = extra_info
+        return response
+
     @extend_schema(responses=IDPasFieldSerializer(many=True))
     @action(detail=False, url_path="private")
     def get_private_idps(self, request: Request):
         """Возвращает список личных ипр авторизованного пользователя."""
-        idps = request.user.idps.all().order_by("-end_date_plan")
-        filtered_idps = self.filter_queryset(idps)
-        if filtered_idps:
-            extra_info = get_idp_extra_info(filtered_idps)
-            page = self.paginate_queryset(filtered_idps)
-            if page:
-                serializer = IDPasFieldSerializer(page, many=True)
-                response = self.get_paginated_response(serializer.data)
-            else:
-                serializer = IDPasFieldSerializer(filtered_idps, many=True)
-                response = Response(data=serializer.data)
-
-            extra_info.update(response.data)
-            response.data = extra_info
-            return response
-        return Response({"detail": "У вас еще нет ИПР."})
+        return self.get_idps_list_response(
+            self.get_private_queryset(), "У вас еще нет ИПР."
+        )
 
     @extend_schema(responses=IDPasFieldSerializer(many=True))
     @action(detail=False, url_path="subordinates")
     def get_subordinates_idps(self, request: Request):
         """Возвращает список ипр подчиненных."""
-        subordinates = request.user.subordinates.all()
-        if not subordinates:
+        if not request.user.subordinates.exists():
             return Response({"detail": "У вас нет сотрудников."})
-        idps = IDP.objects.filter(employee__in=subordinates).exclude(
-            status=IdpStatuses.DRAFT
+        return self.get_idps_list_response(
+            self.get_subordinates_queryset(),
+            "У ваших сотрудников еще нет ИПР.",
         )
-        filtered_idps = self.filter_queryset(idps)
-
-        if filtered_idps:
-            extra_info = get_idp_extra_info(filtered_idps)
-            page = self.paginate_queryset(filtered_idps)
-            if page:
-                serializer = IDPasFieldSerializer(page, many=True)
-                response = self.get_paginated_response(serializer.data)
-            else:
-                serializer = IDPasFieldSerializer(filtered_idps, many=True)
-                response = Response(data=serializer.data)
-
-            extra_info.update(response.data)
-            response.data = extra_info
-
-            return response
-
-        return Response({"detail": "У ваших сотрудников еще нет ИПР."})
 
     @action(detail=False, url_path="export/excel")
     def export_idps_to_excel(self, request):
-        """Экспорт списка ИПР подчиненных в excel файл."""
-        subordinates_data = self.get_subordinates_idps(request).data
-
-        if subordinates_data:
-            excel_file = setup_excel_file(subordinates_data)
-            response = HttpResponse(
-                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        """
+        Экспорт списка ИПР подчиненных в excel файл.
+
+        Небольшой список отдается сразу. Для большого запускается
+        фоновая задача, а файл скачивается по export_id, когда
+        придет событие export или статус станет done.
+        """
+        idps = get_subordinates_idps(request.user.pk)
+        total = idps.count()
+        if not total:
+            return Response({"detail": "Нет данных для экспорта в Excel."})
+        if total > EXCEL_EXPORT_SYNC_LIMIT:
+            export_id = start_subordinates_export(request.user.pk)
+            return Response(
+                {"export_id": export_id, "status": ExportStatuses.PENDING},
+                status=status.HTTP_202_ACCEPTED,
             )
-            response[
-                "Content-Disposition"
-            ] = "attachment; filename=subordinates_idps.xlsx"
-            excel_file.save(response)
-            return response
-        return Response({"detail": "Нет данных для экспорта в Excel."})
+        response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
+        response[
+            "Content-Disposition"
+        ] = f"attachment; filename={EXPORT_FILE_NAME}"
+        write_idps_excel(get_idps_export_rows(idps), response)
+        return response
+
+    @action(detail=False, url_path=r"export/excel/(?P<export_id>[0-9a-f]{32})")
+    def get_idps_export(self, request, export_id: str):
+        """Возвращает файл фонового экспорта или его статус."""
+        export = get_export(request.user.pk, export_id)
+        if export is None:
+            raise NotFound("Экспорт не найден.")
+        if export.status != ExportStatuses.DONE:
+            return Response({"export_id": export_id, "status": export.status})
+        response = get_file_response(
+            export.file.open("rb"), EXPORT_FILE_NAME, 0, export.file.size
+        )
+        response["Content-Type"] = XLSX_CONTENT_TYPE
+        return response
 
 
-class TaskNotificationViewSet(viewsets.ModelViewSet):
-    queryset = TaskNotification.objects.all()
+class TaskNotificationViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = TaskNotification.objects.select_related("notification")
     serializer_class = TaskNotificationSerializer
     permission_classes = (IsAuthenticated,)
 
 
-class IDPNotificationViewSet(viewsets.ModelViewSet):
-    queryset = IdpNotification.objects.all()
+class IDPNotificationViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = IdpNotification.objects.select_related("notification")
     serializer_class = IDPNotificationSerializer
     permission_classes = (IsAuthenticated,)
@@ -0,0 +1,84 @@
+from itertools import islice
+from typing import AsyncIterator, Generator
+
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+
+from api_v1.renderers import CSVRenderer, NDJSONRenderer, StreamingRenderer
+from core.constants import STREAM_CHUNK_SIZE
+
+
+async def stream_in_thread(
+    parts: Generator[str, None, None], chunk_size: int
+) -> AsyncIterator[str]:
+    """
+    Отдает строки синхронного генератора асинхронно, пачками.
+
+    Пачка по chunk_size строк собирается через sync_to_async в потоке
+    запроса, там же выполняются запросы к БД. Под ASGI синхронный
+    генератор был бы прочитан целиком до отправки ответа.
+    """
+    read_chunk = sync_to_async(lambda: list(islice(parts, chunk_size)))
+    try:
+        while True:
+            chunk = await read_chunk()
+            if not chunk:
+                return
+            yield "".join(chunk)
+    finally:
+        # закрывает курсор БД, если клиент отключился раньше
+        await sync_to_async(parts.close)()
+
+
+class StreamingListMixin:
+    """
+    Добавляет спискам вьюсета форматы ?format=csv и ?format=ndjson.
+
+    В этих форматах список отдается целиком без пагинации через
+    StreamingHttpResponse с асинхронным итератором (проект работает
+    под ASGI). Строки читаются из базы курсором частями
+    по STREAM_CHUNK_SIZE, поэтому память не зависит от размера списка.
+    """
+
+    renderer_classes = (
+        *api_settings.DEFAULT_RENDERER_CLASSES,
+        CSVRenderer,
+        NDJSONRenderer,
+    )
+
+    def is_streaming_request(self) -> bool:
+        """Проверяет, запрошен ли потоковый формат."""
+        return isinstance(
+            getattr(self.request, "accepted_renderer", None),
+            StreamingRenderer,
+        )
+
+    def get_streaming_response(
+        self, queryset: QuerySet, serializer_class=None
+    ) -> StreamingHttpResponse:
+        """Отдает все строки queryset в запрошенном потоковом формате."""
+        if serializer_class is None:
+            serializer_class = self.get_serializer_class()
+        serializer = serializer_class(context=self.get_serializer_context())
+        rows = (
+            serializer.to_representation(obj)
+            for obj in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+        )
+        renderer = self.request.accepted_renderer
+        response = StreamingHttpResponse(
+            stream_in_thread(renderer.stream(rows), STREAM_CHUNK_SIZE),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="{self.basename}.{renderer.format}"'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if self.is_streaming_request():
+            return self.get_streaming_response(
+                self.filter_queryset(self.get_queryset())
+            )
+        return super().list(request, *args, **kwargs)
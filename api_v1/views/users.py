@@ -1,18 +1,39 @@
 import logging
 
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    extend_schema,
+    extend_schema_view,
+    inline_serializer,
+)
+from rest_framework import serializers
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from api_v1.pagination import UnionKeysetPagination
 from api_v1.permissions import CreateUserPermission
+from api_v1.serializers.idp_app import (
+    InboxNotificationSerializer,
+    MarkedReadSerializer,
+    NotificationIdsSerializer,
+    NotificationsBeforeSerializer,
+)
 from api_v1.serializers.users import (
     UserCreateSerializer,
     UserSerializer,
     UserUpdateSerializer,
 )
+from api_v1.views.mixins import StreamingListMixin
+from core.choices import NotificationStatuses
+from idp_app.notifications import (
+    get_inbox_querysets,
+    get_unread_count,
+    mark_notifications_read,
+)
 from users.models import User
 
 logger = logging.getLogger(__name__)
@@ -26,7 +47,7 @@ logger = logging.getLogger(__name__)
         request=UserUpdateSerializer, responses=UserSerializer
     ),
 )
-class UserViewSet(ModelViewSet):
+class UserViewSet(StreamingListMixin, ModelViewSet):
     """Вьюсет для объектов User."""
 
     queryset = User.objects.all()
@@ -36,6 +57,15 @@ class UserViewSet(ModelViewSet):
     search_fields = ("^last_name", "^first_name", "^middle_name")
     ordering_fields = ("last_name",)
 
+    def get_queryset(self):
+        """Подгружает связанные объекты, нужные UserSerializer."""
+        queryset = super().get_queryset()
+        if self.request.method == "GET":
+            return queryset.select_related(
+                "position", "chief", "department"
+            ).prefetch_related("mentor_tasks", "idps", "subordinates")
+        return queryset
+
     def get_serializer_class(self):
         if self.action == "update":
             return UserUpdateSerializer
@@ -56,3 +86,89 @@ class UserViewSet(ModelViewSet):
             return Response(data=serializer.data)
         serializer = UserSerializer(request.user)
         return Response(data=serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("status", enum=NotificationStatuses.values),
+            OpenApiParameter("cursor", str),
+        ],
+        responses=InboxNotificationSerializer(many=True),
+    )
+    @action(detail=False, url_path="me/notifications")
+    def get_my_notifications(self, request: Request):
+        """Возвращает уведомления пользователя по ИПР и задачам."""
+        status = request.query_params.get("status")
+        if status is not None and status not in NotificationStatuses.values:
+            raise ValidationError(
+                {
+                    "status": "Допустимые значения: "
+                    f"{', '.join(NotificationStatuses.values)}"
+                }
+            )
+        parts = get_inbox_querysets(request.user, status)
+        if self.is_streaming_request():
+            idps, tasks = parts.values()
+            return self.get_streaming_response(
+                idps.union(tasks, all=True).order_by(
+                    "-date", "-kind", "-item_id"
+                ),
+                InboxNotificationSerializer,
+            )
+        paginator = UnionKeysetPagination()
+        page = paginator.paginate_union(parts, request)
+        serializer = InboxNotificationSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        responses=inline_serializer(
+            "UnreadCount", {"unread_count": serializers.IntegerField()}
+        )
+    )
+    @action(detail=False, url_path="me/unread-count")
+    def get_my_unread_count(self, request: Request):
+        """Возвращает количество непрочитанных уведомлений пользователя."""
+        return Response({"unread_count": get_unread_count(request.user.pk)})
+
+    def get_marked_read_response(self, changed) -> Response:
+        """Возвращает количество прочитанных уведомлений по таблицам."""
+        changed["total"] = sum(changed.values())
+        return Response(data=MarkedReadSerializer(changed).data)
+
+    @extend_schema(request=None, responses=MarkedReadSerializer)
+    @action(
+        methods=["post"], detail=False, url_path="me/notifications/read-all"
+    )
+    def read_all_notifications(self, request: Request):
+        """Отмечает все уведомления пользователя прочитанными."""
+        changed = mark_notifications_read(request.user)
+        return self.get_marked_read_response(changed)
+
+    @extend_schema(
+        request=NotificationIdsSerializer, responses=MarkedReadSerializer
+    )
+    @action(methods=["post"], detail=False, url_path="me/notifications/read")
+    def read_notifications(self, request: Request):
+        """Отмечает прочитанными уведомления пользователя с переданными id."""
+        serializer = NotificationIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = mark_notifications_read(
+            request.user,
+            idp_ids=serializer.validated_data["idp"],
+            task_ids=serializer.validated_data["task"],
+        )
+        return self.get_marked_read_response(changed)
+
+    @extend_schema(
+        request=NotificationsBeforeSerializer, responses=MarkedReadSerializer
+    )
+    @action(
+        methods=["post"], detail=False, url_path="me/notifications/read-before"
+    )
+    def read_notifications_before(self, request: Request):
+        """Отмечает прочитанными уведомления, полученные раньше даты."""
+        serializer = NotificationsBeforeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = mark_notifications_read(
+            request.user, before=serializer.validated_data["before"]
+        )
+        return self.get_marked_read_response(changed)
@@ -46,6 +46,14 @@ class NotificationStatuses(models.TextChoices):
     UNREAD = "Unread"
 
 
+class ExportStatuses(models.TextChoices):
+    """Статусы фонового экспорта в файл."""
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class NotificationTriggers(models.TextChoices):
     """События, после которых создаются уведомления."""
 
@@ -165,6 +173,20 @@ IdpNoteRelation = {
     },
 }
 
+# Статусы задач, в которые они переходят вместе со сменой статуса ИПР
+IdpTaskStatusRelation = {
+    IdpStatuses.ACTIVE: TaskStatuses.ACTIVE_WITH_IDP,
+    IdpStatuses.CANCELLED: TaskStatuses.CANCELLED_WITH_IDP,
+    IdpStatuses.DRAFT_APPROVAL: TaskStatuses.DRAFT_APPROVAL,
+}
+
+# Счетчики задач ИПР, которые меняются вместе со статусом задачи
+TaskCounterRelation = {
+    TaskStatuses.CLOSED: "tasks_closed",
+    TaskStatuses.CANCELLED: "tasks_cancelled",
+    TaskStatuses.CANCELLED_WITH_IDP: "tasks_cancelled",
+}
+
 TaskNoteRelation = {
     TaskStatuses.ACTIVE: {
         "note": NotificationTriggers.TASK_CREATED,
@@ -229,6 +251,11 @@ TaskNoteRelation = {
         "receiver": [UserRoles.employee],
         "message": {UserRoles.employee: "Ваша задача возвращена на доработку"},
     },
+    "updated": {
+        "note": NotificationTriggers.TASK_UPDATED,
+        "receiver": [UserRoles.employee],
+        "message": {UserRoles.employee: "Ваша задача обновлена"},
+    },
     "task_description": {
         "note": NotificationTriggers.TASK_UPDATED,
         "receiver": [UserRoles.employee],
@@ -1,2 +1,56 @@
 DEFAULT_COLUMN_WIDTH = 30
 IDP_NAME_COLUMN_WIDTH = 60
+EXCEL_DATE_FORMAT = "DD.MM.YYYY HH:MM"
+
+# Экспорт до этого количества ИПР собирается прямо в запросе,
+# больший - фоновой задачей celery
+EXCEL_EXPORT_SYNC_LIMIT = 1000
+
+# Количество строк, читаемых из базы за раз при экспорте
+EXCEL_EXPORT_CHUNK_SIZE = 2000
+
+# Количество строк, читаемых из базы за раз в потоковых списках
+STREAM_CHUNK_SIZE = 2000
+
+# Размер блока, которым файлы читаются при скачивании
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Максимальный размер файла и одной части при загрузке частями
+UPLOAD_MAX_SIZE = 1024**3
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+
+# Через сколько часов удалять незавершенные загрузки
+UPLOAD_EXPIRE_HOURS = 24
+
+# Через сколько часов удалять фоновые экспорты и их файлы
+EXPORT_EXPIRE_HOURS = 24
+
+# Сортировка списков ИПР по умолчанию
+IDP_LIST_ORDERING = (
+    "status_rank",
+    "-end_date_plan",
+    "employee__last_name",
+    "employee__first_name",
+    "name",
+)
+
+# Количество событий outbox, обрабатываемых за одну транзакцию
+NOTIFICATION_DISPATCH_BATCH_SIZE = 500
+
+# Количество объектов, статус которых меняется за одну транзакцию
+STATUS_TRANSITION_BATCH_SIZE = 500
+
+# Сколько секунд помнить ключ смены статуса, чтобы отбрасывать дубликаты
+STATUS_TRANSITION_DEDUP_TIMEOUT = 60 * 60 * 24
+
+# Количество задач планировщика, удаляемых за одну транзакцию
+SCHEDULE_PURGE_BATCH_SIZE = 500
+
+# Сколько секунд хранить счетчик непрочитанных уведомлений пользователя
+UNREAD_COUNT_TIMEOUT = 60 * 60 * 24
+
+# Сколько секунд держится метка пересчета счетчика непрочитанных
+UNREAD_RECOUNT_TIMEOUT = 60
+
+# Через сколько секунд тишины отправлять keepalive в поток SSE
+SSE_KEEPALIVE_INTERVAL = 15
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from idp_app.blobs import store_file
+from idp_app.models import File
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит файлы, загруженные до появления Blob, в общее "
+        "хранилище по SHA-256. Одинаковые файлы остаются в одном экземпляре."
+    )
+
+    def handle(self, *args, **options):
+        moved = 0
+        for file_obj in File.objects.filter(blob__isnull=True).iterator():
+            old_name = file_obj.file.name
+            if not old_name or not file_obj.file.storage.exists(old_name):
+                continue
+            with file_obj.file.open("rb"):
+                store_file(file_obj, file_obj.file)
+            if not File.objects.filter(file=old_name).exists():
+                file_obj.file.storage.delete(old_name)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(f"Перенесено файлов: {moved}"))
@@ -1,4 +1,9 @@
+from typing import Any, Dict, Iterable, List, Optional
+
 from django.contrib import admin
+from django.db import models, transaction
+
+from .constants import STATUS_TRANSITION_BATCH_SIZE
 
 
 class EmptyFieldModel(admin.ModelAdmin):
@@ -24,3 +29,167 @@ class MinValidatedInlineMixIn:
         return super().get_formset(
             validate_min=self.validate_min, *args, **kwargs
         )
+
+
+class ChangeTrackingMixin(models.Model):
+    """
+    Абстрактная модель. Отслеживает изменения полей объекта.
+
+    Снимок значений полей делается при загрузке объекта из БД,
+    поэтому для поиска изменений не нужен повторный запрос.
+    При сохранении существующего объекта обновляются только
+    измененные поля, а если изменений нет - запрос не выполняется.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = list(self.get_dirty_fields())
+        super().save(*args, **kwargs)
+        self._take_snapshot(kwargs.get("update_fields"))
+        # значения вычисляет БД, при обращении они загрузятся заново
+        for field in self._meta.concrete_fields:
+            if field.generated:
+                self.__dict__.pop(field.attname, None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._take_snapshot(kwargs.get("fields"))
+
+    def get_dirty_fields(
+        self, fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Возвращает dict измененных полей с их новыми значениями.
+
+        Ключи - attname полей (например, task_mentor_id).
+        Если передан fields, проверяются только указанные поля.
+        """
+        if not hasattr(self, "_snapshot"):
+            self._load_snapshot()
+        deferred = self.get_deferred_fields()
+        return {
+            field.attname: getattr(self, field.attname)
+            for field in self._get_tracked_fields(fields)
+            if field.attname not in deferred
+            and (
+                field.attname not in self._snapshot
+                or self._snapshot[field.attname]
+                != getattr(self, field.attname)
+            )
+        }
+
+    def get_previous_value(self, attname: str) -> Any:
+        """Возвращает значение поля на момент загрузки или сохранения."""
+        if not hasattr(self, "_snapshot"):
+            self._load_snapshot()
+        return self._snapshot.get(attname)
+
+    def _get_tracked_fields(
+        self, fields: Optional[Iterable[str]] = None
+    ) -> List[models.Field]:
+        """Возвращает поля модели, изменения которых отслеживаются."""
+        tracked = [
+            field
+            for field in self._meta.concrete_fields
+            if not field.primary_key and not field.generated
+        ]
+        if fields is None:
+            return tracked
+        fields = set(fields)
+        return [
+            field
+            for field in tracked
+            if field.name in fields or field.attname in fields
+        ]
+
+    def _take_snapshot(self, fields: Optional[Iterable[str]] = None):
+        """Запоминает текущие значения полей (или только указанных)."""
+        snapshot = getattr(self, "_snapshot", {}) if fields else {}
+        deferred = self.get_deferred_fields()
+        for field in self._get_tracked_fields(fields):
+            if field.attname not in deferred:
+                snapshot[field.attname] = getattr(self, field.attname)
+        self._snapshot = snapshot
+
+    def _load_snapshot(self):
+        """
+        Загружает снимок полей из БД.
+
+        Нужен только для объектов, созданных не через from_db,
+        но уже существующих в БД.
+        """
+        attnames = [field.attname for field in self._get_tracked_fields()]
+        self._snapshot = (
+            type(self)
+            ._base_manager.filter(pk=self.pk)
+            .values(*attnames)
+            .first()
+            or {}
+        )
+
+
+class StatusQuerySet(models.QuerySet):
+    """
+    Абстрактный QuerySet. Меняет статус объектов пакетами.
+
+    Каждый пакет блокируется, переводится в новый статус одним UPDATE
+    и передается в _after_status_change для побочных действий
+    (уведомления, счетчики и т.д.) в той же транзакции.
+    Наследники переопределяют _after_status_change под свою модель.
+    """
+
+    status_field = "status"
+    # Дополнительные поля, которые нужны _after_status_change
+    transition_values = ()
+
+    def change_status(
+        self,
+        status: str,
+        batch_size: int = STATUS_TRANSITION_BATCH_SIZE,
+        skip_locked: bool = False,
+    ) -> int:
+        """
+        Переводит объекты QuerySet в статус status.
+
+        Объекты, уже находящиеся в этом статусе, не меняются.
+        По умолчанию строки, заблокированные другими транзакциями,
+        ожидаются. skip_locked=True пропускает их - так можно делать,
+        только если пропущенные строки будут обработаны повторно.
+        Возвращает количество измененных объектов.
+        """
+        queryset = (
+            self.exclude(**{self.status_field: status})
+            .order_by()
+            .select_for_update(skip_locked=skip_locked)
+            .values("pk", self.status_field, *self.transition_values)
+        )
+        changed = 0
+        while True:
+            with transaction.atomic():
+                rows = list(queryset[:batch_size])
+                if not rows:
+                    return changed
+                self.model._base_manager.filter(
+                    pk__in=[row["pk"] for row in rows]
+                ).update(**{self.status_field: status})
+                self._after_status_change(rows, status)
+            changed += len(rows)
+            if len(rows) < batch_size:
+                return changed
+
+    def _after_status_change(self, rows: List[Dict[str, Any]], status: str):
+        """
+        Выполняет побочные действия после смены статуса пакета.
+
+        rows - значения pk, status_field и transition_values
+        до смены статуса. По умолчанию ничего не делает.
+        """
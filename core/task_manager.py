@@ -2,20 +2,51 @@ import json
 import logging
 from datetime import datetime, timedelta
 
+from django.db import transaction
 from django_celery_beat.models import ClockedSchedule, PeriodicTask
 
 from .choices import IdpStatuses, TaskStatuses
+from .constants import SCHEDULE_PURGE_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
-
-def set_idp_status_two_weeks(idp_obj):
-    """Создает задачу для смены статуса ИПР на TWO_WEEKS."""
-    target_date = idp_obj.end_date_plan
-    two_weeks = target_date - timedelta(weeks=2.0)
-    schedule = ClockedSchedule.objects.create(clocked_time=two_weeks)
-    task_name = f"idp_two_weeks_{idp_obj.idp_id}"
-    task_target = "change_idp_status"
+# Статусы, при которых задачи на смену статуса больше не нужны
+IDP_CANCEL_STATUSES = (
+    IdpStatuses.CANCELLED,
+    IdpStatuses.COMPLETED_APPROVAL,
+    IdpStatuses.CLOSED,
+)
+TASK_CANCEL_STATUSES = (
+    TaskStatuses.CANCELLED,
+    TaskStatuses.CANCELLED_WITH_IDP,
+    TaskStatuses.COMPLETED_APPROVAL,
+    TaskStatuses.CLOSED,
+)
+DEADLINE_TASK_TARGETS = ("change_idp_status", "change_task_status")
+
+
+def get_clocked_schedule(clocked_time):
+    """Возвращает расписание на указанное время, создавая его при отсутствии.
+
+    Расписание с одинаковым временем переиспользуется всеми задачами.
+    """
+    schedule = ClockedSchedule.objects.filter(
+        clocked_time=clocked_time
+    ).first()
+    if schedule is None:
+        schedule = ClockedSchedule.objects.create(clocked_time=clocked_time)
+    return schedule
+
+
+def set_status_task(task_name, task_target, clocked_time, kwargs):
+    """
+    Создает или обновляет одноразовую задачу на смену статуса.
+
+    Ключ дедупликации зависит от имени задачи и времени срабатывания,
+    поэтому повторный запуск той же задачи ничего не меняет.
+    """
+    schedule = get_clocked_schedule(clocked_time)
+    kwargs["dedup_key"] = f"{task_name}:{clocked_time.isoformat()}"
 
     try:
         task = PeriodicTask.objects.get(name=task_name)
@@ -25,12 +56,7 @@ def set_idp_status_two_weeks(idp_obj):
             one_off=True,
             name=task_name,
             task=task_target,
-            kwargs=json.dumps(
-                {
-                    "idp_id": str(idp_obj.idp_id),
-                    "status": IdpStatuses.TWO_WEEKS,
-                }
-            ),
+            kwargs=json.dumps(kwargs),
         )
         logger.info(f"created task {task_name}")
         return task
@@ -38,100 +64,66 @@ def set_idp_status_two_weeks(idp_obj):
     task.clocked = schedule
     task.enabled = True
     task.task = task_target
+    task.kwargs = json.dumps(kwargs)
     task.save()
     logger.info(f"updated task {task_name}")
     return task
 
 
-def set_idp_status_overdue(idp_obj):
-    """Создает задачу для смены статуса ИПР на OVERDUE."""
-    target_date = idp_obj.end_date_plan
-    schedule = ClockedSchedule.objects.create(clocked_time=target_date)
-    task_name = f"idp_overdue_{idp_obj.idp_id}"
-    task_target = "change_idp_status"
+def set_idp_status_two_weeks(idp_obj):
+    """Создает задачу для смены статуса ИПР на TWO_WEEKS."""
+    return set_status_task(
+        f"idp_two_weeks_{idp_obj.idp_id}",
+        "change_idp_status",
+        idp_obj.end_date_plan - timedelta(weeks=2.0),
+        {
+            "idp_id": str(idp_obj.idp_id),
+            "status": IdpStatuses.TWO_WEEKS,
+            "expected_statuses": [IdpStatuses.ACTIVE],
+        },
+    )
 
-    try:
-        task = PeriodicTask.objects.get(name=task_name)
-    except PeriodicTask.DoesNotExist:
-        task = PeriodicTask.objects.create(
-            clocked=schedule,
-            one_off=True,
-            name=task_name,
-            task=task_target,
-            kwargs=json.dumps(
-                {"idp_id": str(idp_obj.idp_id), "status": IdpStatuses.OVERDUE}
-            ),
-        )
-        logger.info(f"created task {task_name}")
-        return task
 
-    task.clocked = schedule
-    task.enabled = True
-    task.task = task_target
-    task.save()
-    logger.info(f"updated task {task_name}")
-    return task
+def set_idp_status_overdue(idp_obj):
+    """Создает задачу для смены статуса ИПР на OVERDUE."""
+    return set_status_task(
+        f"idp_overdue_{idp_obj.idp_id}",
+        "change_idp_status",
+        idp_obj.end_date_plan,
+        {
+            "idp_id": str(idp_obj.idp_id),
+            "status": IdpStatuses.OVERDUE,
+            "expected_statuses": [IdpStatuses.ACTIVE, IdpStatuses.TWO_WEEKS],
+        },
+    )
 
 
 def set_task_status_two_weeks(task_obj):
     """Создает задачу для смены статуса задачи на TWO_WEEKS."""
-    target_date = task_obj.task_end_date_plan
-    two_weeks = target_date - timedelta(weeks=2.0)
-    schedule = ClockedSchedule.objects.create(clocked_time=two_weeks)
-    task_name = f"task_two_weeks_{task_obj.task_id}"
-    task_target = "change_task_status"
-
-    try:
-        task = PeriodicTask.objects.get(name=task_name)
-    except PeriodicTask.DoesNotExist:
-        task = PeriodicTask.objects.create(
-            clocked=schedule,
-            one_off=True,
-            name=task_name,
-            task=task_target,
-            kwargs=json.dumps(
-                {"task_id": task_obj.task_id, "status": TaskStatuses.TWO_WEEKS}
-            ),
-        )
-        logger.info(f"created task {task_name}")
-        return task
-
-    task.clocked = schedule
-    task.enabled = True
-    task.task = task_target
-    task.save()
-    logger.info(f"updated task {task_name}")
-    return task
+    return set_status_task(
+        f"task_two_weeks_{task_obj.task_id}",
+        "change_task_status",
+        task_obj.task_end_date_plan - timedelta(weeks=2.0),
+        {
+            "task_id": task_obj.task_id,
+            "status": TaskStatuses.TWO_WEEKS,
+            "expected_statuses": [TaskStatuses.ACTIVE],
+        },
+    )
 
 
 def set_task_status_overdue(task_obj):
     """Создает задачу для смены статуса задачи на OVERDUE."""
-    target_date = task_obj.task_end_date_plan
-    schedule = ClockedSchedule.objects.create(clocked_time=target_date)
-    task_name = f"task_overdue_{task_obj.task_id}"
-    task_target = "change_task_status"
-
-    try:
-        task = PeriodicTask.objects.get(name=task_name)
-    except PeriodicTask.DoesNotExist:
-        task = PeriodicTask.objects.create(
-            clocked=schedule,
-            one_off=True,
-            name=task_name,
-            task=task_target,
-            kwargs=json.dumps(
-                {"task_id": task_obj.task_id, "status": TaskStatuses.OVERDUE}
-            ),
-        )
-        logger.info(f"created task {task_name}")
-        return task
-
-    task.clocked = schedule
-    task.enabled = True
-    task.task = task_target
-    task.save()
-    logger.info(f"updated task {task_name}")
-    return task
+    return set_status_task(
+        f"task_overdue_{task_obj.task_id}",
+        "change_task_status",
+        task_obj.task_end_date_plan,
+        {
+            "task_id": task_obj.task_id,
+            "status": TaskStatuses.OVERDUE,
+            "expected_statuses": [TaskStatuses.ACTIVE, TaskStatuses.TWO_WEEKS],
+        },
+    )
 
 
 def define_idp_task(idp_obj):
@@ -144,27 +136,8 @@ def define_idp_task(idp_obj):
         else:
             set_idp_status_overdue(idp_obj)
 
-    elif idp_obj.status in (
-        IdpStatuses.CANCELLED,
-        IdpStatuses.COMPLETED_APPROVAL,
-    ):
-        two_weeks_task = f"idp_two_week_{idp_obj.idp_id}"
-        overdue_task = f"idp_overdue_{idp_obj.idp_id}"
-        logger.info(f"Cancelling task {idp_obj.idp_id}")
-        task_list = [two_weeks_task, overdue_task]
-
-        current_task = None
-        for task_name in task_list:
-            try:
-                current_task = PeriodicTask.objects.get(name=task_name)
-            except PeriodicTask.DoesNotExist:
-                continue
-            else:
-                break
-        if current_task is not None:
-            current_task.enabled = False
-            current_task.save()
-            logger.info(f"Cancelled task {current_task.name}")
+    elif idp_obj.status in IDP_CANCEL_STATUSES:
+        cancel_idp_tasks([idp_obj.idp_id])
 
 
 def define_task_obj_task(task_obj):
@@ -178,24 +151,63 @@ def define_task_obj_task(task_obj):
         else:
             set_task_status_overdue(task_obj)
 
-    elif task_obj.task_status in (
-        TaskStatuses.CANCELLED,
-        TaskStatuses.COMPLETED_APPROVAL,
-    ):
-        two_weeks_task = f"task_two_week_{task_obj.task_id}"
-        overdue_task = f"task_overdue_{task_obj.task_id}"
-        logger.info(f"Cancelling task {task_obj.task_id}")
-        task_list = [two_weeks_task, overdue_task]
-
-        current_task = None
-        for task_name in task_list:
-            try:
-                current_task = PeriodicTask.objects.get(name=task_name)
-            except PeriodicTask.DoesNotExist:
-                continue
-            else:
-                break
-        if current_task is not None:
-            current_task.enabled = False
-            current_task.save()
-            logger.info(f"Cancelled task {current_task.name}")
+    elif task_obj.task_status in TASK_CANCEL_STATUSES:
+        cancel_task_obj_tasks([task_obj.task_id])
+
+
+def _cancel_tasks(prefix, obj_ids):
+    """Удаляет обе задачи на смену статуса для переданных объектов."""
+    task_names = [
+        f"{prefix}_{kind}_{obj_id}"
+        for obj_id in obj_ids
+        for kind in ("two_weeks", "overdue")
+    ]
+    # удаление через queryset вызывает сигналы, и beat узнает об изменениях
+    cancelled, _ = PeriodicTask.objects.filter(name__in=task_names).delete()
+    if cancelled:
+        logger.info(f"Cancelled {cancelled} tasks")
+    return cancelled
+
+
+def cancel_idp_tasks(idp_ids):
+    """Удаляет задачи на смену статуса для нескольких объектов IDP."""
+    return _cancel_tasks("idp", idp_ids)
+
+
+def cancel_task_obj_tasks(task_ids):
+    """Удаляет задачи на смену статуса для нескольких объектов Task."""
+    return _cancel_tasks("task", task_ids)
+
+
+def _delete_in_batches(queryset, batch_size):
+    """Удаляет объекты queryset порциями, каждую в своей транзакции."""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            pks = list(
+                queryset.order_by().values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                return deleted
+            queryset.model.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+
+
+def purge_spent_schedules(batch_size=SCHEDULE_PURGE_BATCH_SIZE):
+    """Удаляет отработавшие одноразовые задачи и расписания без задач.
+
+    Возвращает количество удаленных задач и расписаний.
+    """
+    spent_tasks = PeriodicTask.objects.filter(
+        one_off=True, enabled=False, task__in=DEADLINE_TASK_TARGETS
+    )
+    tasks_deleted = _delete_in_batches(spent_tasks, batch_size)
+    orphaned_schedules = ClockedSchedule.objects.filter(
+        periodictask__isnull=True
+    )
+    schedules_deleted = _delete_in_batches(orphaned_schedules, batch_size)
+    logger.info(
+        f"Purged {tasks_deleted} spent tasks "
+        f"and {schedules_deleted} orphaned schedules"
+    )
+    return tasks_deleted, schedules_deleted
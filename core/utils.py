@@ -1,66 +1,75 @@
-from datetime import timedelta
-from typing import Dict, List
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional
 
-from django.db.models import Case, Model, Value, When
+from django.db.models import Case, Count, F, Q, QuerySet, Value, When
 from django.utils import timezone
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter
-from pendulum import parse as pendulum_parse
 
-from core.choices import IdpStatuses, TaskStatuses
-from core.constants import DEFAULT_COLUMN_WIDTH, IDP_NAME_COLUMN_WIDTH
+from core.choices import IdpStatuses, TaskCounterRelation, TaskStatuses
+from core.constants import (
+    DEFAULT_COLUMN_WIDTH,
+    EXCEL_DATE_FORMAT,
+    EXCEL_EXPORT_CHUNK_SIZE,
+    IDP_NAME_COLUMN_WIDTH,
+)
 
 
 def default_end_date_plan():
     return timezone.now() + timedelta(days=30)
 
 
-def find_differencies(initial: Model, updated: Model):
+def get_task_counter_deltas(
+    removed: Iterable[str] = (), added: Iterable[str] = ()
+) -> Dict[str, int]:
     """
-    Возвращает различия между полями двух объектов.
+    Возвращает изменения счетчиков задач ИПР.
 
-    Сравнивает два dict исходного и обновленного объектов.
-    Если какое-либо поле отличается, мы берем обновленное значение.
-    Возвращает dict с новыми значениями.
+    Принимает статусы убранных и добавленных задач. Смена статуса
+    задачи - это удаление задачи со старым статусом и добавление
+    с новым. Нулевые изменения не возвращаются.
     """
-    d1 = initial.__dict__
-    d2 = updated.__dict__
-    diffs = {k: v for k, v in d2.items() if v != d1[k]}
-    if "_state" in diffs:
-        # _state нам без надобности, поэтому убираем
-        del diffs["_state"]
-    return diffs
+    deltas = defaultdict(int)
+    for statuses, sign in ((removed, -1), (added, 1)):
+        for status in statuses:
+            deltas["tasks_total"] += sign
+            counter = TaskCounterRelation.get(status)
+            if counter is not None:
+                deltas[counter] += sign
+    return {counter: delta for counter, delta in deltas.items() if delta}
 
 
-def get_idp_extra_info(idps: List[Model]) -> Dict[str, int]:
+def get_idp_extra_info(idps: QuerySet) -> Dict[str, int]:
     """
     Генерирует дополнительные поля для ответа на запрос ИПР.
 
-    Считает количество ипр по статусам.
+    Считает количество ипр по статусам одним запросом.
     """
-    extra_info = {
-        "in_total": 0,
-        IdpStatuses.ACTIVE: 0,
-        IdpStatuses.CLOSED: 0,
-        IdpStatuses.OVERDUE: 0,
-    }
-    for idp in idps:
-        if idp.status in (
+    active = Q(
+        status__in=(
             IdpStatuses.ACTIVE,
             IdpStatuses.TWO_WEEKS,
             IdpStatuses.COMPLETED_APPROVAL,
             IdpStatuses.DRAFT_APPROVAL,
-        ):
-            extra_info["in_total"] += 1
-            extra_info[IdpStatuses.ACTIVE] += 1
-        elif idp.status == IdpStatuses.CLOSED:
-            extra_info["in_total"] += 1
-            extra_info[IdpStatuses.CLOSED] += 1
-        elif idp.status == IdpStatuses.OVERDUE:
-            extra_info["in_total"] += 1
-            extra_info[IdpStatuses.OVERDUE] += 1
-    return extra_info
+        )
+    )
+    closed = Q(status=IdpStatuses.CLOSED)
+    overdue = Q(status=IdpStatuses.OVERDUE)
+    counts = idps.order_by().aggregate(
+        in_total=Count("pk", filter=active | closed | overdue),
+        active=Count("pk", filter=active),
+        closed=Count("pk", filter=closed),
+        overdue=Count("pk", filter=overdue),
+    )
+    return {
+        "in_total": counts["in_total"],
+        IdpStatuses.ACTIVE: counts["active"],
+        IdpStatuses.CLOSED: counts["closed"],
+        IdpStatuses.OVERDUE: counts["overdue"],
+    }
 
 
 def get_extensions():
@@ -80,10 +89,43 @@ def get_extensions():
     return extensions, content_types
 
 
-def setup_excel_file(data):
-    """Настройка Excel-файла для экспорта ИПР подчиненных."""
-    workbook = Workbook()
-    excel_sheet = workbook.active
+# Поля ИПР, которые попадают в Excel-файл
+IDP_EXPORT_FIELDS = (
+    "name",
+    "employee__first_name",
+    "employee__last_name",
+    "end_date_plan",
+    "end_date_fact",
+    "status",
+)
+
+
+def get_idps_export_rows(idps: QuerySet) -> Iterator[Dict[str, Any]]:
+    """Возвращает строки ИПР для экспорта, читая базу частями."""
+    return idps.values(*IDP_EXPORT_FIELDS).iterator(
+        chunk_size=EXCEL_EXPORT_CHUNK_SIZE
+    )
+
+
+def _date_cell(excel_sheet, value: Optional[datetime]) -> WriteOnlyCell:
+    # openpyxl не хранит часовой пояс, дата пишется в локальном времени
+    if value is not None:
+        value = timezone.localtime(value).replace(tzinfo=None)
+    cell = WriteOnlyCell(excel_sheet, value=value)
+    cell.number_format = EXCEL_DATE_FORMAT
+    return cell
+
+
+def write_idps_excel(rows: Iterable[Dict[str, Any]], output):
+    """
+    Записывает ИПР подчиненных в Excel-файл.
+
+    Книга открывается в режиме write-only, строки пишутся по одной,
+    поэтому память не зависит от количества ИПР. rows - строки
+    из get_idps_export_rows, output - путь или файловый объект.
+    """
+    workbook = Workbook(write_only=True)
+    excel_sheet = workbook.create_sheet()
     headers = [
         "План развития",
         "Cотрудник",
@@ -91,31 +133,30 @@ def setup_excel_file(data):
         "Фактическая дата закрытия",
         "Статус",
     ]
-    for col_num, header in enumerate(headers, 1):
+    for col_num in range(1, len(headers) + 1):
         col_letter = get_column_letter(col_num)
-        cell = excel_sheet[f"{col_letter}1"]
-        cell.value = header
-        cell.font = Font(bold=True)
         excel_sheet.column_dimensions[col_letter].width = DEFAULT_COLUMN_WIDTH
-        excel_sheet.column_dimensions["A"].width = IDP_NAME_COLUMN_WIDTH
-    for row_num, idp in enumerate(data["results"], 2):
-        excel_sheet[f"A{row_num}"] = idp.get("name", "")
-        employee = idp.get("employee", {})
-        employee_name = (
-            f"{employee.get('first_name', '')} {employee.get('last_name', '')}"
+    excel_sheet.column_dimensions["A"].width = IDP_NAME_COLUMN_WIDTH
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(excel_sheet, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    excel_sheet.append(header_cells)
+    for idp in rows:
+        excel_sheet.append(
+            [
+                idp["name"],
+                f"{idp['employee__first_name']} "
+                f"{idp['employee__last_name']}",
+                _date_cell(excel_sheet, idp["end_date_plan"]),
+                _date_cell(excel_sheet, idp["end_date_fact"]),
+                str(IdpStatuses(idp["status"]).label),
+            ]
         )
-        excel_sheet[f"B{row_num}"] = employee_name
-        time_str = idp.get("end_date_plan", "")
-        end_date_plan = pendulum_parse(time_str)
-        formatted_date = end_date_plan.format("DD:MM:YYYY HH:mm")
-        excel_sheet[f"C{row_num}"] = formatted_date
-        excel_sheet[f"D{row_num}"] = idp.get("end_date_fact", "")
-        status_eng = idp.get("status", "")
-        status_label = getattr(IdpStatuses, status_eng.upper()).label
-        excel_sheet[f"E{row_num}"] = status_label
-    return workbook
-  
-  
+    workbook.save(output)
+
+
 # Упорядочивает по статусам ипр
 idp_status_order = Case(
     When(status=IdpStatuses.DRAFT_APPROVAL, then=Value(1)),
@@ -137,3 +178,15 @@ task_status_order = Case(
     When(task_status=TaskStatuses.CLOSED, then=Value(6)),
     When(task_status=TaskStatuses.CANCELLED, then=Value(7)),
 )
+
+# Фактическая дата для выполненных ипр, плановая для остальных
+idp_effective_end_date = Case(
+    When(status=IdpStatuses.CLOSED, then=F("end_date_fact")),
+    default=F("end_date_plan"),
+)
+
+# Фактическая дата для выполненных задач, плановая для остальных
+task_effective_end_date = Case(
+    When(task_status=TaskStatuses.CLOSED, then=F("task_end_date_fact")),
+    default=F("task_end_date_plan"),
+)
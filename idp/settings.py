@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # 3d party apps
     "rest_framework",
     "drf_spectacular",
@@ -115,7 +116,8 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend"
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    # ?pagination=cursor включает курсорный режим вместо номеров страниц
+    "DEFAULT_PAGINATION_CLASS": "api_v1.pagination.KeysetPagination",
     "PAGE_SIZE": 10,
 }
 
@@ -166,6 +168,63 @@ CELERY_TIMEZONE = "Europe/Moscow"
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 # если планировщик запущен, добавить в .env INCLUDE_CELERY = True
 INCLUDE_CELERY = os.getenv("INCLUDE_CELERY", False)
+# если уведомления должны создаваться воркером, NOTIFICATIONS_ASYNC = True
+NOTIFICATIONS_ASYNC = os.getenv("NOTIFICATIONS_ASYNC", "False") == "True"
+CELERY_BEAT_SCHEDULE = {
+    # добирает события outbox, которые не удалось отправить сразу
+    "dispatch_notifications": {
+        "task": "dispatch_notifications",
+        "schedule": timedelta(minutes=1),
+    },
+    # удаляет отработавшие одноразовые задачи и расписания без задач
+    "purge_schedules": {
+        "task": "purge_schedules",
+        "schedule": timedelta(days=1),
+    },
+    # удаляет брошенные загрузки файлов частями
+    "purge_uploads": {
+        "task": "purge_uploads",
+        "schedule": timedelta(hours=1),
+    },
+    # удаляет устаревшие фоновые экспорты и их файлы
+    "purge_exports": {
+        "task": "purge_exports",
+        "schedule": timedelta(hours=1),
+    },
+}
+# если вместо отдельной задачи планировщика на каждый ИПР и задачу
+# нужна одна периодическая проверка сроков, DEADLINE_SWEEPER = True
+DEADLINE_SWEEPER = os.getenv("DEADLINE_SWEEPER", "False") == "True"
+DEADLINE_SWEEPER_INTERVAL = int(os.getenv("DEADLINE_SWEEPER_INTERVAL", 5))
+if DEADLINE_SWEEPER:
+    CELERY_BEAT_SCHEDULE["sweep_deadlines"] = {
+        "task": "sweep_deadlines",
+        "schedule": timedelta(minutes=DEADLINE_SWEEPER_INTERVAL),
+    }
+
+# CACHE SETTINGS
+
+# Для нескольких процессов/серверов указать в .env общий кеш,
+# например CACHE_URL='redis://localhost:6379/1'
+CACHE_URL = os.getenv("CACHE_URL")
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Pub/sub для доставки уведомлений в реальном времени (SSE).
+# Без PUBSUB_URL сообщения ходят только внутри одного процесса.
+PUBSUB_URL = os.getenv("PUBSUB_URL", CACHE_URL)
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -187,6 +246,15 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Если файлы должен отдавать прокси-сервер, указать в .env
+# FILE_DOWNLOAD_OFFLOAD=x-accel-redirect (nginx) или x-sendfile (Apache).
+# Для nginx нужен internal location FILE_DOWNLOAD_ACCEL_PREFIX,
+# который указывает на MEDIA_ROOT.
+FILE_DOWNLOAD_OFFLOAD = os.getenv("FILE_DOWNLOAD_OFFLOAD", "")
+FILE_DOWNLOAD_ACCEL_PREFIX = os.getenv(
+    "FILE_DOWNLOAD_ACCEL_PREFIX", "/protected/"
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
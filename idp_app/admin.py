@@ -7,6 +7,7 @@ from .models import (
     File,
     IdpNotification,
     Notification,
+    NotificationEvent,
     Task,
     TaskNotification,
 )
@@ -86,9 +87,15 @@ class TaskNoteAdmin(EmptyFieldModel):
     search_fields = ("date", "task", "notification__name")
 
 
+class NotificationEventAdmin(EmptyFieldModel):
+    list_display = ("relation_key", "idp", "task", "created")
+    list_filter = ("relation_key",)
+
+
 admin.site.register(Task, TaskAdmin)
 admin.site.register(File, FileAdmin)
 admin.site.register(IDP, IDPAdmin)
 admin.site.register(Notification, NotificationAdmin)
 admin.site.register(IdpNotification, IdpNoteAdmin)
 admin.site.register(TaskNotification, TaskNoteAdmin)
+admin.site.register(NotificationEvent, NotificationEventAdmin)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class IdpAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "idp_app"
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
+        from .pubsub import check_broker
+
+        check_broker()
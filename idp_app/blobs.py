@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import uuid
+from typing import Optional, Tuple
+
+from django.core.files import File as DjangoFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob, File
+
+logger = logging.getLogger(__name__)
+
+BLOB_PATH = "blobs/{}/{}/{}"
+BLOB_TMP_PATH = "blobs/tmp/{}"
+
+
+class HashingReader:
+    """Читает содержимое файла блоками и считает SHA-256 прочитанного."""
+
+    def __init__(self, content):
+        self.chunks = content.chunks()
+        self.size = getattr(content, "size", None)
+        self.sha256 = hashlib.sha256()
+        self.total = 0
+        self.buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.sha256.update(chunk)
+            self.total += len(chunk)
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def get_blob_name(digest: str) -> str:
+    return BLOB_PATH.format(digest[:2], digest[2:4], digest)
+
+
+def write_temp_blob(content) -> Tuple[str, str, int]:
+    """
+    Сохраняет содержимое во временный файл хранилища.
+
+    SHA-256 считается во время записи, файл читается один раз.
+    Возвращает имя временного файла, SHA-256 и размер.
+    """
+    reader = HashingReader(content)
+    tmp_name = default_storage.save(
+        BLOB_TMP_PATH.format(uuid.uuid4().hex), DjangoFile(reader)
+    )
+    return tmp_name, reader.sha256.hexdigest(), reader.total
+
+
+def move_storage_file(tmp_name: str, name: str):
+    """Переносит временный файл хранилища на постоянное место."""
+    try:
+        tmp_path = default_storage.path(tmp_name)
+        path = default_storage.path(name)
+    except NotImplementedError:
+        # хранилище без локальных путей: копируем и удаляем временный
+        if not default_storage.exists(name):
+            with default_storage.open(tmp_name, "rb") as tmp_file:
+                default_storage.save(name, tmp_file)
+        default_storage.delete(tmp_name)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+def acquire_blob(tmp_name: str, digest: str, size: int) -> Tuple[Blob, bool]:
+    """
+    Возвращает Blob с данным SHA-256 и увеличивает его счетчик ссылок.
+
+    Если такое содержимое уже хранится, временный файл удаляется,
+    иначе он становится файлом нового Blob. Строка нового Blob
+    вставляется до переноса файла и держит блокировку до коммита,
+    поэтому delete_blob_file для того же SHA-256 ждет этой транзакции.
+    Второе значение - True, если файл перенесен этим вызовом.
+    """
+    with transaction.atomic():
+        if Blob.objects.filter(pk=digest).update(refs=F("refs") + 1):
+            default_storage.delete(tmp_name)
+            return Blob.objects.get(pk=digest), False
+        name = get_blob_name(digest)
+        try:
+            with transaction.atomic():
+                blob = Blob.objects.create(
+                    sha256=digest, file=name, size=size, refs=1
+                )
+        except IntegrityError:
+            # такой же Blob только что создала параллельная загрузка
+            Blob.objects.filter(pk=digest).update(refs=F("refs") + 1)
+            default_storage.delete(tmp_name)
+            return Blob.objects.get(pk=digest), False
+        move_storage_file(tmp_name, name)
+        return blob, True
+
+
+def release_blob(blob_id: str):
+    """
+    Уменьшает счетчик ссылок Blob и удаляет Blob без ссылок.
+
+    Счетчик проверяется под блокировкой строки, поэтому Blob, который
+    снова получила параллельная загрузка, не удаляется. Файл удаляется
+    из хранилища только после коммита удаления строки.
+    """
+    with transaction.atomic():
+        Blob.objects.filter(pk=blob_id).update(refs=F("refs") - 1)
+        blob = (
+            Blob.objects.select_for_update().filter(pk=blob_id, refs=0).first()
+        )
+        if blob is not None:
+            blob.delete()
+            transaction.on_commit(lambda: delete_blob_file(blob_id))
+            logger.info(f"Deleted blob {blob_id}")
+
+
+def delete_blob_file(digest: str):
+    """
+    Удаляет файл Blob из хранилища, если строки Blob нет.
+
+    Проверка и удаление выполняются под вставленной строкой-заглушкой:
+    acquire_blob тоже сначала вставляет строку и только потом переносит
+    файл, поэтому они не могут выполняться для одного SHA-256 сразу.
+    """
+    name = get_blob_name(digest)
+    try:
+        with transaction.atomic():
+            Blob.objects.create(sha256=digest, file=name, size=0, refs=0)
+            default_storage.delete(name)
+            Blob.objects.filter(pk=digest).delete()
+    except IntegrityError:
+        # Blob с этим содержимым снова существует, файл ему нужен
+        pass
+
+
+def store_file(
+    file_obj: File, content, expected_sha256: Optional[str] = None
+) -> str:
+    """
+    Сохраняет содержимое файла в общем хранилище Blob и сохраняет File.
+
+    Одинаковое содержимое хранится один раз. Если передан
+    expected_sha256 и сумма не совпала, бросает ValueError.
+    Возвращает SHA-256 содержимого.
+    """
+    tmp_name, digest, size = write_temp_blob(content)
+    if expected_sha256 and expected_sha256.lower() != digest:
+        default_storage.delete(tmp_name)
+        raise ValueError("Контрольная сумма файла не совпадает.")
+    store_temp_blob(file_obj, tmp_name, digest, size)
+    return digest
+
+
+def store_temp_blob(file_obj: File, tmp_name: str, digest: str, size: int):
+    """
+    Привязывает File к Blob из временного файла и сохраняет File.
+
+    Временный файл переносится в хранилище Blob или удаляется.
+    """
+    created = False
+    try:
+        with transaction.atomic():
+            old_blob_id = file_obj.blob_id
+            blob, created = acquire_blob(tmp_name, digest, size)
+            file_obj.blob = blob
+            file_obj.file.name = blob.file.name
+            file_obj.save()
+            if old_blob_id is not None:
+                transaction.on_commit(lambda: release_blob(old_blob_id))
+    except Exception:
+        default_storage.delete(tmp_name)
+        if created:
+            # новый Blob откатился, а его файл уже перенесен в хранилище
+            delete_blob_file(digest)
+        raise
@@ -0,0 +1,104 @@
+import logging
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from core.choices import ExportStatuses, IdpStatuses
+from core.constants import EXPORT_EXPIRE_HOURS, IDP_LIST_ORDERING
+from core.utils import get_idps_export_rows, write_idps_excel
+from idp import sched
+from idp.settings import INCLUDE_CELERY
+from idp_app.notifications import NOTIFICATION_CHANNEL
+from idp_app.pubsub import publish
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FILE_PATH = "exports/{}.xlsx"
+
+
+def get_subordinates_idps(user_id) -> QuerySet:
+    """Возвращает ИПР подчиненных пользователя для экспорта."""
+    idp_model = apps.get_model("idp_app", "IDP")
+    return (
+        idp_model.objects.filter(employee__chief_id=user_id)
+        .exclude(status=IdpStatuses.DRAFT)
+        .order_by(*IDP_LIST_ORDERING)
+    )
+
+
+def get_export(user_id, export_id: str):
+    """Возвращает фоновый экспорт пользователя или None."""
+    export_model = apps.get_model("idp_app", "IdpExport")
+    return export_model.objects.filter(
+        pk=uuid.UUID(export_id), owner_id=user_id
+    ).first()
+
+
+def set_export_status(export, status: str, file_name: str = ""):
+    """Сохраняет статус экспорта и сообщает о нем пользователю."""
+    export.status, export.file = status, file_name
+    export.save(update_fields=("status", "file"))
+    publish(
+        NOTIFICATION_CHANNEL.format(export.owner_id),
+        "export",
+        {"export_id": export.pk.hex, "status": status},
+    )
+
+
+def start_subordinates_export(user_id) -> str:
+    """Запускает фоновый экспорт ИПР подчиненных и возвращает его id."""
+    export_model = apps.get_model("idp_app", "IdpExport")
+    export_id = export_model.objects.create(owner_id=user_id).pk.hex
+    task = sched.tasks["export_subordinates_idps"]
+    if INCLUDE_CELERY:
+        task.delay(export_id)
+    else:
+        task.apply(args=(export_id,))
+    return export_id
+
+
+def export_subordinates_idps(export_id: str) -> str:
+    """
+    Собирает Excel-файл с ИПР подчиненных в хранилище файлов.
+
+    Файл пишется во временный файл на диске, затем сохраняется
+    в default_storage. Возвращает имя сохраненного файла.
+    """
+    export_model = apps.get_model("idp_app", "IdpExport")
+    export = export_model.objects.get(pk=uuid.UUID(export_id))
+    user_id = export.owner_id
+    try:
+        with tempfile.TemporaryFile() as output:
+            write_idps_excel(
+                get_idps_export_rows(get_subordinates_idps(user_id)), output
+            )
+            output.seek(0)
+            file_name = default_storage.save(
+                EXPORT_FILE_PATH.format(export_id), File(output)
+            )
+    except Exception:
+        set_export_status(export, ExportStatuses.FAILED)
+        raise
+    set_export_status(export, ExportStatuses.DONE, file_name)
+    logger.info(f"Exported idps of {user_id} to {file_name}")
+    return file_name
+
+
+def purge_stale_exports() -> int:
+    """Удаляет экспорты старше EXPORT_EXPIRE_HOURS вместе с файлами."""
+    export_model = apps.get_model("idp_app", "IdpExport")
+    expired = timezone.now() - timedelta(hours=EXPORT_EXPIRE_HOURS)
+    purged = 0
+    for export in export_model.objects.filter(created__lt=expired).iterator():
+        if export.file:
+            export.file.delete(save=False)
+        export.delete()
+        purged += 1
+    logger.info(f"Purged {purged} stale exports")
+    return purged
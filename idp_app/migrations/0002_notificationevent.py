@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationEvent",
+            fields=[
+                (
+                    "event_id",
+                    models.BigAutoField(
+                        primary_key=True, serialize=False, verbose_name="event_id"
+                    ),
+                ),
+                (
+                    "relation_key",
+                    models.CharField(max_length=50, verbose_name="relation_key"),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="event_created_datetime"
+                    ),
+                ),
+                (
+                    "idp",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notice_events",
+                        to="idp_app.idp",
+                        verbose_name="idp",
+                    ),
+                ),
+                (
+                    "task",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notice_events",
+                        to="idp_app.task",
+                        verbose_name="task",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification event",
+                "verbose_name_plural": "Notification events",
+                "ordering": ("event_id",),
+            },
+        ),
+    ]
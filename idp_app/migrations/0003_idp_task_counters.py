@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_idp_tasks(apps, schema_editor):
+    """Заполняет счетчики задач для уже существующих ИПР."""
+    IDP = apps.get_model("idp_app", "IDP")
+    Task = apps.get_model("idp_app", "Task")
+
+    def tasks_count(*statuses):
+        tasks = Task.objects.filter(idp=OuterRef("pk"))
+        if statuses:
+            tasks = tasks.filter(task_status__in=statuses)
+        tasks = tasks.order_by().values("idp").annotate(count=Count("pk"))
+        return Coalesce(Subquery(tasks.values("count")), Value(0))
+
+    IDP.objects.update(
+        tasks_total=tasks_count(),
+        tasks_closed=tasks_count("closed"),
+        tasks_cancelled=tasks_count("cancelled", "cancelled_with_idp"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0002_notificationevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idp",
+            name="tasks_cancelled",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="tasks_cancelled"
+            ),
+        ),
+        migrations.AddField(
+            model_name="idp",
+            name="tasks_closed",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="tasks_closed"
+            ),
+        ),
+        migrations.AddField(
+            model_name="idp",
+            name="tasks_total",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="tasks_total"
+            ),
+        ),
+        migrations.RunPython(count_idp_tasks, migrations.RunPython.noop),
+    ]
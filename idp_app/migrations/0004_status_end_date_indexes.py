@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0003_idp_task_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="idp",
+            index=models.Index(
+                fields=["status", "end_date_plan"], name="idp_status_end_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["task_status", "task_end_date_plan"],
+                name="task_status_end_date_idx",
+            ),
+        ),
+    ]
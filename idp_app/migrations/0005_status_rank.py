@@ -0,0 +1,71 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0004_status_end_date_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idp",
+            name="status_rank",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(status="draft_approval", then=models.Value(1)),
+                    models.When(status="active", then=models.Value(2)),
+                    models.When(status="two_weeks", then=models.Value(3)),
+                    models.When(status="overdue", then=models.Value(4)),
+                    models.When(status="completed_approval", then=models.Value(5)),
+                    models.When(status="closed", then=models.Value(6)),
+                    models.When(status="cancelled", then=models.Value(7)),
+                ),
+                output_field=models.PositiveSmallIntegerField(),
+                verbose_name="status_rank",
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="task_status_rank",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(task_status="draft_approval", then=models.Value(1)),
+                    models.When(task_status="active", then=models.Value(2)),
+                    models.When(task_status="two_weeks", then=models.Value(3)),
+                    models.When(task_status="overdue", then=models.Value(4)),
+                    models.When(task_status="completed_approval", then=models.Value(5)),
+                    models.When(task_status="closed", then=models.Value(6)),
+                    models.When(task_status="cancelled", then=models.Value(7)),
+                ),
+                output_field=models.PositiveSmallIntegerField(),
+                verbose_name="task_status_rank",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="idp",
+            index=models.Index(
+                fields=["status_rank", "-end_date_plan"], name="idp_rank_end_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="idp",
+            index=models.Index(
+                fields=["employee", "status_rank", "-end_date_plan"],
+                name="idp_employee_rank_end_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["idp", "task_status_rank", "-task_end_date_plan"],
+                name="task_idp_rank_end_date_idx",
+            ),
+        ),
+    ]
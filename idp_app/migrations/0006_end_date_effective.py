@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0005_status_rank"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idp",
+            name="end_date_effective",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(status="closed", then=models.F("end_date_fact")),
+                    default=models.F("end_date_plan"),
+                ),
+                output_field=models.DateTimeField(null=True),
+                verbose_name="end_date_effective",
+            ),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="task_end_date_effective",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        task_status="closed", then=models.F("task_end_date_fact")
+                    ),
+                    default=models.F("task_end_date_plan"),
+                ),
+                output_field=models.DateTimeField(null=True),
+                verbose_name="task_end_date_effective",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="idp",
+            index=models.Index(
+                fields=["end_date_effective"], name="idp_end_date_effective_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["idp", "task_end_date_effective"],
+                name="task_idp_end_effective_idx",
+            ),
+        ),
+    ]
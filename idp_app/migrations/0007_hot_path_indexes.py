@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0006_end_date_effective"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="idp",
+            index=models.Index(
+                fields=["employee", "status"], name="idp_employee_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="idpnotification",
+            index=models.Index(
+                fields=["receiver", "status", "-date"], name="idp_notice_receiver_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="idpnotification",
+            index=models.Index(
+                condition=models.Q(("status", "Unread")),
+                fields=["receiver", "-date"],
+                name="idp_notice_unread_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["idp", "task_status"], name="task_idp_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["task_mentor", "task_status"], name="task_mentor_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tasknotification",
+            index=models.Index(
+                fields=["receiver", "status", "-date"], name="task_notice_receiver_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tasknotification",
+            index=models.Index(
+                condition=models.Q(("status", "Unread")),
+                fields=["receiver", "-date"],
+                name="task_notice_unread_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:17
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0007_hot_path_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileUpload",
+            fields=[
+                (
+                    "upload_id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="upload_id",
+                    ),
+                ),
+                (
+                    "file_name",
+                    models.CharField(max_length=100, verbose_name="file_name"),
+                ),
+                (
+                    "file_type",
+                    models.CharField(
+                        blank=True, max_length=50, verbose_name="file_type"
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField(verbose_name="file_size")),
+                (
+                    "offset",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="received_bytes"
+                    ),
+                ),
+                (
+                    "sha256",
+                    models.CharField(
+                        blank=True, max_length=64, verbose_name="expected_sha256"
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="upload_created_datetime"
+                    ),
+                ),
+                (
+                    "file_task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="file_uploads",
+                        to="idp_app.task",
+                        verbose_name="file_task",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="file_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="owner",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "File upload",
+                "verbose_name_plural": "File uploads",
+                "ordering": ("created",),
+            },
+        ),
+    ]
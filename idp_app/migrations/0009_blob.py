@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("idp_app", "0008_file_upload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="sha256",
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        max_length=255, upload_to="", verbose_name="blob_file"
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField(verbose_name="blob_size")),
+                (
+                    "refs",
+                    models.PositiveIntegerField(default=0, verbose_name="references"),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="blob_created_datetime"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Blob",
+                "verbose_name_plural": "Blobs",
+            },
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="files",
+                to="idp_app.blob",
+                verbose_name="blob",
+            ),
+        ),
+    ]
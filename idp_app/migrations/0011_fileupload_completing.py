@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("idp_app", "0010_idpexport"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fileupload",
+            name="completing",
+            field=models.BooleanField(default=False, verbose_name="upload_completing"),
+        ),
+    ]
@@ -1,28 +1,126 @@
 import uuid
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.urls import reverse
 
 from core.choices import (
+    ExportStatuses,
     IdpNoteRelation,
     IdpStatuses,
+    IdpTaskStatusRelation,
     NotificationStatuses,
     NotificationTriggers,
     TaskNoteRelation,
     TaskStatuses,
     UserRoles,
 )
-from core.task_manager import define_idp_task, define_task_obj_task
-from core.utils import default_end_date_plan, find_differencies
-from idp.settings import INCLUDE_CELERY
+from core.models import ChangeTrackingMixin, StatusQuerySet
+from core.task_manager import (
+    IDP_CANCEL_STATUSES,
+    TASK_CANCEL_STATUSES,
+    cancel_idp_tasks,
+    cancel_task_obj_tasks,
+    define_idp_task,
+    define_task_obj_task,
+)
+from core.utils import (
+    default_end_date_plan,
+    get_task_counter_deltas,
+    idp_effective_end_date,
+    idp_status_order,
+    task_effective_end_date,
+    task_status_order,
+)
+from idp.settings import DEADLINE_SWEEPER, INCLUDE_CELERY
+
+from .notifications import send_notification_events
 
 User = get_user_model()
 
+# Отдельные задачи планировщика на каждый объект не нужны,
+# если сроки проверяет sweep_deadlines
+SCHEDULE_DEADLINE_TASKS = INCLUDE_CELERY and not DEADLINE_SWEEPER
+
+
+class IDPQuerySet(StatusQuerySet):
+    """QuerySet для IDP."""
+
+    def _after_status_change(self, rows: List[Dict[str, Any]], status: str):
+        idp_ids = [row["pk"] for row in rows]
+        if status in IdpNoteRelation:
+            NotificationEvent.record(
+                [
+                    NotificationEvent(idp_id=idp_id, relation_key=status)
+                    for idp_id in idp_ids
+                ]
+            )
+        task_status = IdpTaskStatusRelation.get(status)
+        if task_status is not None:
+            Task.objects.filter(idp__in=idp_ids).change_status(task_status)
+        if SCHEDULE_DEADLINE_TASKS:
+            transaction.on_commit(
+                lambda: self._define_deadline_tasks(idp_ids, status)
+            )
+
+    def _define_deadline_tasks(self, idp_ids: List[uuid.UUID], status: str):
+        if status in IDP_CANCEL_STATUSES:
+            cancel_idp_tasks(idp_ids)
+            return
+        for idp in IDP.objects.filter(pk__in=idp_ids):
+            define_idp_task(idp)
+
+
+class TaskQuerySet(StatusQuerySet):
+    """QuerySet для Task."""
+
+    status_field = "task_status"
+    transition_values = ("idp_id",)
+
+    def _after_status_change(self, rows: List[Dict[str, Any]], status: str):
+        task_ids = [row["pk"] for row in rows]
+        if status in TaskNoteRelation:
+            NotificationEvent.record(
+                [
+                    NotificationEvent(task_id=task_id, relation_key=status)
+                    for task_id in task_ids
+                ]
+            )
+        previous_statuses = defaultdict(list)
+        for row in rows:
+            previous_statuses[row["idp_id"]].append(row["task_status"])
+        for idp_id, statuses in previous_statuses.items():
+            IDP.update_task_counters(
+                idp_id,
+                get_task_counter_deltas(
+                    removed=statuses, added=[status] * len(statuses)
+                ),
+            )
+        if status == TaskStatuses.CLOSED:
+            IDP.objects.filter(
+                pk__in=list(previous_statuses), tasks_closed=F("tasks_total")
+            ).change_status(IdpStatuses.COMPLETED_APPROVAL)
+        if SCHEDULE_DEADLINE_TASKS:
+            transaction.on_commit(
+                lambda: self._define_deadline_tasks(task_ids, status)
+            )
+
+    def _define_deadline_tasks(self, task_ids: List[int], status: str):
+        if status in TASK_CANCEL_STATUSES:
+            cancel_task_obj_tasks(task_ids)
+        elif status in (TaskStatuses.ACTIVE, TaskStatuses.TWO_WEEKS):
+            tasks = Task.objects.filter(
+                pk__in=task_ids, task_end_date_plan__isnull=False
+            )
+            for task in tasks:
+                define_task_obj_task(task)
+
 
-class IDP(models.Model):
+class IDP(ChangeTrackingMixin, models.Model):
     """Таблица ИПР."""
 
     idp_id = models.UUIDField(
@@ -65,58 +163,134 @@ class IDP(models.Model):
         verbose_name="notifications",
         blank=True,
     )
+    tasks_total = models.PositiveIntegerField(
+        verbose_name="tasks_total", default=0, editable=False
+    )
+    tasks_closed = models.PositiveIntegerField(
+        verbose_name="tasks_closed", default=0, editable=False
+    )
+    tasks_cancelled = models.PositiveIntegerField(
+        verbose_name="tasks_cancelled", default=0, editable=False
+    )
+    # Порядок статуса для сортировки, хранится в БД и попадает в индексы
+    status_rank = models.GeneratedField(
+        expression=idp_status_order,
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+        verbose_name="status_rank",
+    )
+    # Срок, по которому фильтруется ИПР: фактический для выполненных
+    end_date_effective = models.GeneratedField(
+        expression=idp_effective_end_date,
+        output_field=models.DateTimeField(null=True),
+        db_persist=True,
+        verbose_name="end_date_effective",
+    )
+
+    objects = IDPQuerySet.as_manager()
 
     class Meta:
         ordering = ("name", "start_date")
         verbose_name = "IDP"
         verbose_name_plural = "IDPs"
+        indexes = (
+            models.Index(
+                fields=("status", "end_date_plan"),
+                name="idp_status_end_date_idx",
+            ),
+            models.Index(
+                fields=("status_rank", "-end_date_plan"),
+                name="idp_rank_end_date_idx",
+            ),
+            models.Index(
+                fields=("employee", "status_rank", "-end_date_plan"),
+                name="idp_employee_rank_end_date_idx",
+            ),
+            models.Index(
+                fields=("end_date_effective",),
+                name="idp_end_date_effective_idx",
+            ),
+            models.Index(
+                fields=("employee", "status"),
+                name="idp_employee_status_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def progress(self) -> int:
+        """Процент выполненных задач без учета отмененных."""
+        tasks_count = self.tasks_total - self.tasks_cancelled
+        if not tasks_count:
+            return 0
+        return round(self.tasks_closed * 100 / tasks_count)
+
+    @classmethod
+    def update_task_counters(cls, idp_id: uuid.UUID, deltas: Dict[str, int]):
+        """Атомарно меняет счетчики задач ИПР на переданные величины."""
+        if deltas:
+            cls.objects.filter(pk=idp_id).update(
+                **{
+                    counter: F(counter) + delta
+                    for counter, delta in deltas.items()
+                }
+            )
+
     def save(self, *args, **kwargs):
-        try:
-            _original = IDP.objects.get(idp_id=self.pk)
-            differencies = find_differencies(_original, self)
-            super().save(*args, **kwargs)
-            self._handle_differencies(differencies)
-        except self.DoesNotExist:
-            super().save(*args, **kwargs)
-            trigger = IdpNoteRelation.get(self.status)
-            if trigger is not None:
-                self._create_notification(trigger)
-            self._change_tasks_status(self.status)
-        if INCLUDE_CELERY:
+        adding = self._state.adding
+        differencies = (
+            {}
+            if adding
+            else self.get_dirty_fields(kwargs.get("update_fields"))
+        )
+        if adding or differencies:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if adding:
+                    self._create_notification_events(self.status)
+                    self._change_tasks_status(self.status)
+                else:
+                    self._handle_differencies(differencies)
+        if SCHEDULE_DEADLINE_TASKS:
             define_idp_task(self)
 
-    def _create_notification(self, trigger: Dict[str, Any]):
-        try:
-            note = Notification.objects.get(trigger=trigger.get("note"))
-            messages = trigger.get("message")
-            receivers_messages = self._get_receiver_and_message(
-                users=trigger.get("receiver", [UserRoles.employee]),
-                messages=messages,
+    def _create_notification_events(self, *relation_keys: str):
+        """Добавляет в outbox события для уведомлений по ИПР."""
+        NotificationEvent.record(
+            [
+                NotificationEvent(idp=self, relation_key=key)
+                for key in relation_keys
+                if key in IdpNoteRelation
+            ]
+        )
+
+    def _build_notifications(
+        self, trigger: Dict[str, Any], note: "Notification"
+    ) -> List["IdpNotification"]:
+        """Возвращает несохраненные уведомления по ИПР для получателей."""
+        receivers_messages = self._get_receiver_and_message(
+            users=trigger.get("receiver", [UserRoles.employee]),
+            messages=trigger.get("message"),
+        )
+        url = self.get_absolute_url()
+        return [
+            IdpNotification(
+                notification=note,
+                idp=self,
+                receiver=receiver,
+                message=f"{message} {url}",
             )
-            for receiver, message in receivers_messages.items():
-                final_message = f"{message} {self.get_absolute_url()}"
-                IdpNotification.objects.create(
-                    notification=note,
-                    idp=self,
-                    receiver=receiver,
-                    message=final_message,
-                )
-        except Notification.DoesNotExist:
-            return None
+            for receiver, message in receivers_messages.items()
+        ]
 
     def _handle_differencies(self, differencies: Dict[str, Any]):
         if "status" in differencies:
-            trigger = IdpNoteRelation.get(self.status)
-            if trigger:
-                self._create_notification(trigger)
+            self._create_notification_events(self.status)
             self._change_tasks_status(self.status)
         else:
-            trigger = IdpNoteRelation.get("updated")
-            self._create_notification(trigger)
+            self._create_notification_events("updated")
 
     def _get_receiver_and_message(
         self, users: List[str], messages: Dict[str, str]
@@ -138,22 +312,15 @@ class IDP(models.Model):
 
         Статус задач полуаем из словаря соответствий статусов.
         """
-        statuses = {
-            IdpStatuses.ACTIVE: TaskStatuses.ACTIVE_WITH_IDP,
-            IdpStatuses.CANCELLED: TaskStatuses.CANCELLED_WITH_IDP,
-            IdpStatuses.DRAFT_APPROVAL: TaskStatuses.DRAFT_APPROVAL,
-        }
-        updated_status = statuses.get(status)
+        updated_status = IdpTaskStatusRelation.get(status)
         if updated_status:
-            for task in self.tasks.all():
-                task.task_status = updated_status
-                task.save()
+            self.tasks.change_status(updated_status)
 
     def get_absolute_url(self):
         return reverse("idp-detail", kwargs={"pk": self.pk})
 
 
-class Task(models.Model):
+class Task(ChangeTrackingMixin, models.Model):
     """Таблица для задач."""
 
     task_id = models.AutoField(primary_key=True, verbose_name="task_id")
@@ -212,60 +379,119 @@ class Task(models.Model):
         verbose_name="notifications",
         blank=True,
     )
+    # Порядок статуса для сортировки, хранится в БД и попадает в индексы
+    task_status_rank = models.GeneratedField(
+        expression=task_status_order,
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+        verbose_name="task_status_rank",
+    )
+    # Срок, по которому фильтруется задача: фактический для выполненных
+    task_end_date_effective = models.GeneratedField(
+        expression=task_effective_end_date,
+        output_field=models.DateTimeField(null=True),
+        db_persist=True,
+        verbose_name="task_end_date_effective",
+    )
+
+    objects = TaskQuerySet.as_manager()
 
     class Meta:
         ordering = ("task_id",)
         verbose_name = "Task"
         verbose_name_plural = "Tasks"
+        indexes = (
+            models.Index(
+                fields=("task_status", "task_end_date_plan"),
+                name="task_status_end_date_idx",
+            ),
+            models.Index(
+                fields=("idp", "task_status_rank", "-task_end_date_plan"),
+                name="task_idp_rank_end_date_idx",
+            ),
+            models.Index(
+                fields=("idp", "task_end_date_effective"),
+                name="task_idp_end_effective_idx",
+            ),
+            models.Index(
+                fields=("idp", "task_status"),
+                name="task_idp_status_idx",
+            ),
+            models.Index(
+                fields=("task_mentor", "task_status"),
+                name="task_mentor_status_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"Task №{self.task_id}"
 
     def save(self, *args, **kwargs):
-        try:
-            _original = Task.objects.get(task_id=self.pk)
-            differencies = find_differencies(_original, self)
-            super().save(*args, **kwargs)
-            self._handle_differencies(differencies)
-        except self.DoesNotExist:
-            super().save(*args, **kwargs)
-            trigger = TaskNoteRelation.get(self.task_status)
-            if trigger is not None:
-                self._create_notification(trigger)
-        if INCLUDE_CELERY:
+        adding = self._state.adding
+        differencies = (
+            {}
+            if adding
+            else self.get_dirty_fields(kwargs.get("update_fields"))
+        )
+        if adding or differencies:
+            previous = (
+                None
+                if adding
+                else (
+                    self.get_previous_value("idp_id"),
+                    self.get_previous_value("task_status"),
+                )
+            )
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self._update_idp_counters(previous)
+                if adding:
+                    self._create_notification_events(self.task_status)
+                else:
+                    self._handle_differencies(differencies)
+        if SCHEDULE_DEADLINE_TASKS:
             define_task_obj_task(self)
 
-    def _create_notification(self, trigger: Dict[str, Any]):
-        try:
-            note = Notification.objects.get(trigger=trigger.get("note"))
-            messages = trigger.get("message")
-            receivers_messages = self._get_receiver_and_message(
-                users=trigger.get("receiver", [UserRoles.employee]),
-                messages=messages,
+    def _create_notification_events(self, *relation_keys: str):
+        """Добавляет в outbox события для уведомлений по задаче."""
+        NotificationEvent.record(
+            [
+                NotificationEvent(task=self, relation_key=key)
+                for key in relation_keys
+                if key in TaskNoteRelation
+            ]
+        )
+
+    def _build_notifications(
+        self, trigger: Dict[str, Any], note: "Notification"
+    ) -> List["TaskNotification"]:
+        """Возвращает несохраненные уведомления по задаче для получателей."""
+        receivers_messages = self._get_receiver_and_message(
+            users=trigger.get("receiver", [UserRoles.employee]),
+            messages=trigger.get("message"),
+        )
+        url = self.get_absolute_url()
+        return [
+            TaskNotification(
+                notification=note,
+                task=self,
+                receiver=receiver,
+                message=f"{message} {url}",
             )
-            for receiver, message in receivers_messages.items():
-                final_message = f"{message} {self.get_absolute_url()}"
-                TaskNotification.objects.create(
-                    notification=note,
-                    task=self,
-                    receiver=receiver,
-                    message=final_message,
-                )
-        except Notification.DoesNotExist:
-            return None
+            for receiver, message in receivers_messages.items()
+        ]
 
     def _handle_differencies(self, differencies: Dict[str, Any]):
+        relation_keys = list(differencies)
         if "task_status" in differencies:
-            trigger = TaskNoteRelation.get(self.task_status)
-            del differencies["task_status"]
-            if trigger:
-                self._create_notification(trigger)
-            if self.task_status == TaskStatuses.CLOSED:
-                self._check_other_tasks()
-        for field in differencies.keys():
-            trigger = TaskNoteRelation.get(field)
-            if trigger:
-                self._create_notification(trigger)
+            relation_keys.remove("task_status")
+            relation_keys.insert(0, self.task_status)
+        self._create_notification_events(*relation_keys)
+        if (
+            "task_status" in differencies
+            and self.task_status == TaskStatuses.CLOSED
+        ):
+            self._check_other_tasks()
 
     def _get_receiver_and_message(
         self, users: List[str], messages: Dict[str, str]
@@ -282,17 +508,47 @@ class Task(models.Model):
         }
         return {receivers.get(user): messages.get(user) for user in users}
 
+    def _update_idp_counters(self, previous: Optional[Tuple[Any, str]]):
+        """
+        Обновляет счетчики задач ИПР после сохранения задачи.
+
+        previous - ИПР и статус задачи до сохранения,
+        None для новой задачи.
+        """
+        if previous is None:
+            IDP.update_task_counters(
+                self.idp_id, get_task_counter_deltas(added=[self.task_status])
+            )
+            return
+        previous_idp_id, previous_status = previous
+        if previous_idp_id == self.idp_id:
+            IDP.update_task_counters(
+                self.idp_id,
+                get_task_counter_deltas(
+                    removed=[previous_status], added=[self.task_status]
+                ),
+            )
+            return
+        IDP.update_task_counters(
+            previous_idp_id, get_task_counter_deltas(removed=[previous_status])
+        )
+        IDP.update_task_counters(
+            self.idp_id, get_task_counter_deltas(added=[self.task_status])
+        )
+
     def _check_other_tasks(self):
-        all_tasks_done = True
-        # проверяем остальные таски на завершенность
-        for task in self.idp.tasks.all():
-            if not all_tasks_done:
-                break
-            if task.task_status != TaskStatuses.CLOSED:
-                all_tasks_done = False
-        if all_tasks_done:
-            self.idp.status = IdpStatuses.COMPLETED_APPROVAL
-            self.idp.save()
+        """
+        Отправляет ИПР на подтверждение, если закрыты все его задачи.
+
+        Счетчики уже обновлены в этой транзакции, а строка ИПР
+        заблокирована их UPDATE, поэтому одновременное закрытие
+        нескольких задач не приводит к гонке.
+        """
+        idp = IDP.objects.get(pk=self.idp_id)
+        if idp.tasks_closed == idp.tasks_total:
+            idp.status = IdpStatuses.COMPLETED_APPROVAL
+            idp.save()
+        self.idp = idp
 
     def get_absolute_url(self):
         return reverse(
@@ -300,6 +556,32 @@ class Task(models.Model):
         )
 
 
+class Blob(models.Model):
+    """
+    Содержимое файла, которое хранится один раз под своим SHA-256.
+
+    refs - количество объектов File с этим содержимым. Когда
+    удаляется последний File, удаляется и Blob с файлом в хранилище.
+    """
+
+    sha256 = models.CharField(
+        primary_key=True, verbose_name="sha256", max_length=64
+    )
+    file = models.FileField(verbose_name="blob_file", max_length=255)
+    size = models.PositiveBigIntegerField(verbose_name="blob_size")
+    refs = models.PositiveIntegerField(verbose_name="references", default=0)
+    created = models.DateTimeField(
+        verbose_name="blob_created_datetime", auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = "Blob"
+        verbose_name_plural = "Blobs"
+
+    def __str__(self) -> str:
+        return self.sha256
+
+
 class File(models.Model):
     """Таблица для файлов."""
 
@@ -318,6 +600,15 @@ class File(models.Model):
         related_name="task_files",
         default=None,
     )
+    # Файлы, загруженные до появления Blob, хранятся отдельно
+    blob = models.ForeignKey(
+        Blob,
+        on_delete=models.PROTECT,
+        verbose_name="blob",
+        related_name="files",
+        blank=True,
+        null=True,
+    )
 
     class Meta:
         ordering = ("file_id",)
@@ -328,6 +619,104 @@ class File(models.Model):
         return self.file_name
 
 
+class FileUpload(models.Model):
+    """
+    Незавершенная загрузка файла частями.
+
+    Части сохраняются в хранилище по мере получения, объект File
+    создается после получения всего файла.
+    """
+
+    upload_id = models.UUIDField(
+        primary_key=True,
+        verbose_name="upload_id",
+        default=uuid.uuid4,
+        editable=False,
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="file_uploads",
+        verbose_name="owner",
+    )
+    file_task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="file_uploads",
+        verbose_name="file_task",
+    )
+    file_name = models.CharField(verbose_name="file_name", max_length=100)
+    file_type = models.CharField(
+        verbose_name="file_type", max_length=50, blank=True
+    )
+    size = models.PositiveBigIntegerField(verbose_name="file_size")
+    # Сколько байт с начала файла уже получено
+    offset = models.PositiveBigIntegerField(
+        verbose_name="received_bytes", default=0
+    )
+    # SHA-256 от клиента для проверки собранного файла
+    sha256 = models.CharField(
+        verbose_name="expected_sha256", max_length=64, blank=True
+    )
+    # Части уже собираются в файл, новые части не принимаются
+    completing = models.BooleanField(
+        verbose_name="upload_completing", default=False
+    )
+    created = models.DateTimeField(
+        verbose_name="upload_created_datetime", auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ("created",)
+        verbose_name = "File upload"
+        verbose_name_plural = "File uploads"
+
+    def __str__(self) -> str:
+        return f"{self.file_name} {self.offset}/{self.size}"
+
+
+class IdpExport(models.Model):
+    """
+    Фоновый экспорт ИПР подчиненных в Excel.
+
+    Статус хранится в БД, поэтому его видят и веб-процессы,
+    и воркер Celery, который собирает файл.
+    """
+
+    export_id = models.UUIDField(
+        primary_key=True,
+        verbose_name="export_id",
+        default=uuid.uuid4,
+        editable=False,
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="idp_exports",
+        verbose_name="owner",
+    )
+    status = models.CharField(
+        verbose_name="export_status",
+        choices=ExportStatuses,
+        max_length=20,
+        default=ExportStatuses.PENDING,
+    )
+    file = models.FileField(verbose_name="export_file", blank=True)
+    created = models.DateTimeField(
+        verbose_name="export_created_datetime",
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    class Meta:
+        ordering = ("created",)
+        verbose_name = "IDP export"
+        verbose_name_plural = "IDP exports"
+
+    def __str__(self) -> str:
+        return f"{self.export_id} {self.status}"
+
+
 class Notification(models.Model):
     """Таблица для уведомлений."""
 
@@ -392,6 +781,20 @@ class TaskNotification(models.Model):
         default=NotificationStatuses.UNREAD,
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=("receiver", "status", "-date"),
+                name="task_notice_receiver_idx",
+            ),
+            # непрочитанные уведомления пользователя, новые первыми
+            models.Index(
+                fields=("receiver", "-date"),
+                condition=Q(status=NotificationStatuses.UNREAD),
+                name="task_notice_unread_idx",
+            ),
+        )
+
     def __str__(self) -> str:
         return f"{self.notification} {self.task}"
 
@@ -434,5 +837,69 @@ class IdpNotification(models.Model):
         default=NotificationStatuses.UNREAD,
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=("receiver", "status", "-date"),
+                name="idp_notice_receiver_idx",
+            ),
+            # непрочитанные уведомления пользователя, новые первыми
+            models.Index(
+                fields=("receiver", "-date"),
+                condition=Q(status=NotificationStatuses.UNREAD),
+                name="idp_notice_unread_idx",
+            ),
+        )
+
     def __str__(self) -> str:
         return f"{self.notification} {self.idp}"
+
+
+class NotificationEvent(models.Model):
+    """
+    Таблица событий для создания уведомлений (outbox).
+
+    События записываются в той же транзакции, что и изменение
+    ИПР или задачи, а уведомления по ним создаются после коммита.
+    """
+
+    event_id = models.BigAutoField(primary_key=True, verbose_name="event_id")
+    idp = models.ForeignKey(
+        IDP,
+        on_delete=models.CASCADE,
+        related_name="notice_events",
+        verbose_name="idp",
+        blank=True,
+        null=True,
+    )
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="notice_events",
+        verbose_name="task",
+        blank=True,
+        null=True,
+    )
+    # Ключ из словарей IdpNoteRelation/TaskNoteRelation
+    relation_key = models.CharField(verbose_name="relation_key", max_length=50)
+    created = models.DateTimeField(
+        verbose_name="event_created_datetime", auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ("event_id",)
+        verbose_name = "Notification event"
+        verbose_name_plural = "Notification events"
+
+    def __str__(self) -> str:
+        return f"{self.relation_key} {self.idp_id or self.task_id}"
+
+    @classmethod
+    def record(cls, events: List["NotificationEvent"]):
+        """Сохраняет события и после коммита отправляет их на обработку."""
+        if not events:
+            return
+        event_ids = [event.pk for event in cls.objects.bulk_create(events)]
+        transaction.on_commit(
+            lambda: send_notification_events(event_ids), robust=True
+        )
@@ -0,0 +1,265 @@
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    CharField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    UUIDField,
+    Value,
+)
+
+from core.choices import NotificationStatuses
+from core.constants import UNREAD_COUNT_TIMEOUT, UNREAD_RECOUNT_TIMEOUT
+from idp import sched
+from idp.settings import NOTIFICATIONS_ASYNC
+from idp_app.pubsub import publish
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_VERSION_KEY = "notification_registry_version"
+UNREAD_COUNT_KEY = "unread_notifications:{}"
+NOTIFICATION_CHANNEL = "notifications:{}"
+
+# Кеш объектов Notification в памяти процесса
+_registry = {"version": None, "notifications": {}, "missing": set()}
+
+
+def _get_registry_version() -> str:
+    """Возвращает текущую версию реестра из общего кеша Django."""
+    version = cache.get(REGISTRY_VERSION_KEY)
+    if version is None:
+        cache.add(REGISTRY_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(REGISTRY_VERSION_KEY)
+    return version
+
+
+def _load_registry(version: str):
+    """Загружает все объекты Notification в реестр процесса."""
+    notification_model = apps.get_model("idp_app", "Notification")
+    notifications = {}
+    for note in notification_model.objects.order_by("-notice_id"):
+        notifications[note.trigger] = note
+    _registry.update(
+        version=version, notifications=notifications, missing=set()
+    )
+    logger.info(f"Loaded {len(notifications)} notifications")
+
+
+def get_notification(trigger: str):
+    """
+    Возвращает объект Notification по триггеру.
+
+    Таблица загружается один раз на процесс и перечитывается только
+    после изменения версии реестра. Если триггера нет в таблице,
+    возвращает None и пишет об этом в лог один раз.
+    """
+    version = _get_registry_version()
+    if _registry["version"] != version:
+        _load_registry(version)
+    note = _registry["notifications"].get(trigger)
+    if note is None and trigger not in _registry["missing"]:
+        _registry["missing"].add(trigger)
+        logger.warning(f"Notification with trigger {trigger} does not exist")
+    return note
+
+
+def invalidate_notification_registry():
+    """Меняет версию реестра, чтобы все процессы перечитали таблицу."""
+    cache.set(REGISTRY_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def coalesce_relation_keys(
+    relation_keys: List[str], statuses: Iterable[str]
+) -> List[str]:
+    """
+    Схлопывает ключи событий по одному объекту.
+
+    Повторяющиеся ключи отбрасываются, смены статуса сохраняются.
+    Если изменилось несколько полей, вместо уведомления на каждое
+    поле остается одно общее уведомление об обновлении.
+    """
+    statuses = set(statuses)
+    unique_keys = list(dict.fromkeys(relation_keys))
+    status_keys = [key for key in unique_keys if key in statuses]
+    field_keys = [key for key in unique_keys if key not in statuses]
+    if len(field_keys) > 1:
+        field_keys = ["updated"]
+    return status_keys + field_keys
+
+
+def send_notification_events(event_ids: List[int]):
+    """
+    Отправляет события outbox на обработку.
+
+    Если NOTIFICATIONS_ASYNC включен, задача уходит воркеру celery,
+    иначе выполняется сразу в текущем процессе.
+    """
+    task = sched.tasks["dispatch_notifications"]
+    if NOTIFICATIONS_ASYNC:
+        task.delay(event_ids)
+    else:
+        task.apply(args=(event_ids,))
+
+
+def get_inbox_querysets(user, status: Optional[str] = None):
+    """
+    Возвращает уведомления пользователя по ИПР и по задачам.
+
+    Обе части - values() с одинаковыми колонками, чтобы их можно
+    было объединить через UNION ALL. Ключи - значения колонки kind.
+    """
+    parts = {}
+    for kind, model_name, idp, task in (
+        ("idp", "IdpNotification", F("idp_id"), Value(None)),
+        ("task", "TaskNotification", F("task__idp_id"), F("task_id")),
+    ):
+        queryset = apps.get_model("idp_app", model_name).objects.filter(
+            receiver=user
+        )
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        parts[kind] = queryset.annotate(
+            kind=Value(kind, output_field=CharField()),
+            item_id=F("pk"),
+            notification_name=F("notification__name"),
+            idp_ref=ExpressionWrapper(idp, output_field=UUIDField()),
+            task_ref=ExpressionWrapper(task, output_field=IntegerField()),
+        ).values(
+            "message",
+            "date",
+            "status",
+            "kind",
+            "item_id",
+            "notification_name",
+            "idp_ref",
+            "task_ref",
+        )
+    return parts
+
+
+def get_unread_count(user_id) -> int:
+    """
+    Возвращает количество непрочитанных уведомлений пользователя.
+
+    Значение берется из кеша. Если его там нет, уведомления
+    пересчитываются в базе. Перед пересчетом в кеш кладется метка,
+    и счетчик сохраняется, только если метка осталась на месте:
+    если счетчик сбросили во время пересчета, результат мог
+    устареть и в кеш не попадает.
+    """
+    key = UNREAD_COUNT_KEY.format(user_id)
+    count = cache.get(key)
+    if isinstance(count, int):
+        return count
+    marker = uuid.uuid4().hex
+    cache.add(key, marker, UNREAD_RECOUNT_TIMEOUT)
+    count = sum(
+        apps.get_model("idp_app", model_name)
+        .objects.filter(
+            receiver_id=user_id, status=NotificationStatuses.UNREAD
+        )
+        .count()
+        for model_name in ("IdpNotification", "TaskNotification")
+    )
+    if cache.get(key) == marker:
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def get_inbox_item(note) -> Dict[str, Any]:
+    """Возвращает уведомление в виде элемента общего списка уведомлений."""
+    if note._meta.model_name == "idpnotification":
+        kind, idp_id, task_id = "idp", note.idp_id, None
+    else:
+        kind, idp_id, task_id = "task", note.task.idp_id, note.task_id
+    return {
+        "id": note.pk,
+        "kind": kind,
+        "notification": note.notification.name,
+        "idp": idp_id,
+        "task": task_id,
+        "message": note.message,
+        "date": note.date,
+        "status": note.status,
+    }
+
+
+def publish_notifications(notifications: Iterable):
+    """Отправляет новые уведомления подписчикам их получателей."""
+    for note in notifications:
+        if note.receiver_id is not None:
+            publish(
+                NOTIFICATION_CHANNEL.format(note.receiver_id),
+                "notification",
+                get_inbox_item(note),
+            )
+
+
+def handle_created_notifications(notifications: Iterable):
+    """
+    Обрабатывает созданные уведомления после коммита.
+
+    Сбрасывает счетчики непрочитанных получателей и отправляет
+    уведомления в pub/sub, откуда их получают открытые потоки SSE.
+    """
+    notifications = list(notifications)
+    reset_unread_counts(
+        note.receiver_id
+        for note in notifications
+        if note.status == NotificationStatuses.UNREAD
+    )
+    publish_notifications(notifications)
+
+
+def reset_unread_counts(receiver_ids: Iterable):
+    """Удаляет счетчики непрочитанных, чтобы они были пересчитаны."""
+    cache.delete_many(
+        [
+            UNREAD_COUNT_KEY.format(receiver_id)
+            for receiver_id in set(receiver_ids)
+            if receiver_id is not None
+        ]
+    )
+
+
+def mark_notifications_read(
+    user,
+    idp_ids: Optional[Iterable[int]] = None,
+    task_ids: Optional[Iterable[int]] = None,
+    before: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Отмечает непрочитанные уведомления пользователя прочитанными.
+
+    Каждая таблица обновляется одним UPDATE. Если переданы id только
+    одной таблицы, другая не обновляется. Возвращает количество
+    измененных уведомлений по таблицам.
+    """
+    filter_by_ids = idp_ids is not None or task_ids is not None
+    changed = {}
+    with transaction.atomic():
+        for kind, model_name, ids in (
+            ("idp", "IdpNotification", idp_ids),
+            ("task", "TaskNotification", task_ids),
+        ):
+            if filter_by_ids and not ids:
+                changed[kind] = 0
+                continue
+            queryset = apps.get_model("idp_app", model_name).objects.filter(
+                receiver=user, status=NotificationStatuses.UNREAD
+            )
+            if ids:
+                queryset = queryset.filter(pk__in=ids)
+            if before is not None:
+                queryset = queryset.filter(date__lt=before)
+            changed[kind] = queryset.update(status=NotificationStatuses.READ)
+        if any(changed.values()):
+            transaction.on_commit(lambda: reset_unread_counts([user.pk]))
+    return changed
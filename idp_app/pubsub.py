@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from idp.settings import INCLUDE_CELERY, NOTIFICATIONS_ASYNC, PUBSUB_URL
+
+logger = logging.getLogger(__name__)
+
+# Ждет следующее сообщение не дольше timeout секунд, иначе None
+Receiver = Callable[[float], Awaitable[Optional[str]]]
+# Сообщение - имя события и JSON через перевод строки
+MESSAGE_FORMAT = "{}\n{}"
+
+
+class InMemoryBroker:
+    """
+    Pub/sub в памяти процесса.
+
+    Подходит для одного процесса и для тестов. Публиковать можно
+    из любого потока: сообщение передается в event loop подписчика.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, data: str):
+        with self._lock:
+            subscribers = list(self._subscribers[channel])
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, data)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[Receiver]:
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+
+        async def receive(timeout: float) -> Optional[str]:
+            try:
+                return await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        try:
+            yield receive
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker:
+    """Pub/sub через Redis, доставляет сообщения между процессами."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+
+    def publish(self, channel: str, data: str):
+        if self._client is None:
+            self._client = Redis.from_url(self.url)
+        self._client.publish(channel, data)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[Receiver]:
+        client = AsyncRedis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+
+        async def receive(timeout: float) -> Optional[str]:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=timeout
+            )
+            if message is None:
+                return None
+            return message["data"].decode()
+
+        try:
+            yield receive
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+
+
+def get_broker():
+    """Возвращает брокер Redis, если задан PUBSUB_URL, иначе в памяти."""
+    global _broker
+    if _broker is None:
+        _broker = RedisBroker(PUBSUB_URL) if PUBSUB_URL else InMemoryBroker()
+    return _broker
+
+
+def check_broker():
+    """
+    Предупреждает о брокере в памяти при включенном celery.
+
+    События, опубликованные воркерами celery, не дойдут до SSE-подписчиков.
+    """
+    if not PUBSUB_URL and (INCLUDE_CELERY or NOTIFICATIONS_ASYNC):
+        logger.warning(
+            "PUBSUB_URL and CACHE_URL are not set, events published "
+            "by celery workers will not reach SSE subscribers"
+        )
+
+
+def publish(channel: str, event: str, message: Dict[str, Any]):
+    """Публикует сообщение; ошибка брокера не прерывает вызывающий код."""
+    data = json.dumps(message, cls=DjangoJSONEncoder)
+    try:
+        get_broker().publish(channel, MESSAGE_FORMAT.format(event, data))
+    except Exception:
+        logger.exception(f"Failed to publish to {channel}")
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.utils import get_task_counter_deltas
+
+from .blobs import release_blob
+from .models import (
+    IDP,
+    File,
+    IdpNotification,
+    Notification,
+    Task,
+    TaskNotification,
+)
+from .notifications import (
+    handle_created_notifications,
+    invalidate_notification_registry,
+    reset_unread_counts,
+)
+
+
+@receiver((post_save, post_delete), sender=Notification)
+def reset_notification_registry(**kwargs):
+    """Сбрасывает реестр уведомлений после изменения Notification."""
+    invalidate_notification_registry()
+
+
+@receiver(post_delete, sender=Task)
+def decrease_task_counters(instance: Task, origin=None, **kwargs):
+    """
+    Уменьшает счетчики задач ИПР после удаления задачи.
+
+    Задачи удаляются каскадом только вместе со своим ИПР,
+    в этом случае счетчики не обновляются.
+    """
+    if isinstance(origin, QuerySet):
+        origin = origin.model
+    elif origin is not None:
+        origin = type(origin)
+    if origin not in (None, Task):
+        return
+    IDP.update_task_counters(
+        instance.idp_id,
+        get_task_counter_deltas(removed=[instance.task_status]),
+    )
+
+
+@receiver(post_delete, sender=File)
+def release_file_blob(instance: File, **kwargs):
+    """Освобождает Blob удаленного файла после коммита."""
+    if instance.blob_id is not None:
+        transaction.on_commit(lambda: release_blob(instance.blob_id))
+
+
+@receiver(post_save, sender=IdpNotification)
+@receiver(post_save, sender=TaskNotification)
+def update_unread_count(instance, created: bool, **kwargs):
+    """
+    Сбрасывает счетчик непрочитанных после коммита.
+
+    Новое уведомление еще и отправляется подписчикам.
+    """
+    if created:
+        transaction.on_commit(lambda: handle_created_notifications([instance]))
+    else:
+        transaction.on_commit(
+            lambda: reset_unread_counts([instance.receiver_id])
+        )
+
+
+@receiver(post_delete, sender=IdpNotification)
+@receiver(post_delete, sender=TaskNotification)
+def drop_unread_count(instance, **kwargs):
+    """Сбрасывает счетчик непрочитанных после удаления уведомления."""
+    transaction.on_commit(lambda: reset_unread_counts([instance.receiver_id]))
@@ -1,31 +1,276 @@
 import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import List, Optional
 
 from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
-from .models import IDP, Task
+from core.choices import (
+    IdpNoteRelation,
+    IdpStatuses,
+    TaskNoteRelation,
+    TaskStatuses,
+)
+from core.constants import (
+    NOTIFICATION_DISPATCH_BATCH_SIZE,
+    STATUS_TRANSITION_DEDUP_TIMEOUT,
+)
+from core.models import StatusQuerySet
+from core.task_manager import purge_spent_schedules
+
+from . import exports, uploads
+from .models import (
+    IDP,
+    IdpNotification,
+    NotificationEvent,
+    Task,
+    TaskNotification,
+)
+from .notifications import (
+    coalesce_relation_keys,
+    get_notification,
+    handle_created_notifications,
+)
 
 logger = logging.getLogger(__name__)
 
+SWEEPER_LAST_RUN_KEY = "deadline_sweeper_last_run"
+STATUS_TRANSITION_KEY_PREFIX = "status_transition:"
+
 
 @shared_task(name="change_idp_status")
-def change_idp_status(idp_id: str, status: str):
+def change_idp_status(
+    idp_id: str,
+    status: str,
+    expected_statuses: Optional[List[str]] = None,
+    dedup_key: Optional[str] = None,
+) -> int:
     """Меняет статус ИПР по его id."""
-    try:
-        logger.info(f"Changing idp {idp_id}")
-        idp_obj = IDP.objects.get(idp_id=idp_id)
-        idp_obj.status = status
-        idp_obj.save()
-    except IDP.DoesNotExist:
-        logger.error(f"Idp obj does not exists {idp_id}")
+    logger.info(f"Changing idp {idp_id}")
+    return _change_status(
+        IDP.objects.filter(pk=idp_id), status, expected_statuses, dedup_key
+    )
 
 
 @shared_task(name="change_task_status")
-def change_task_status(task_id: int, status: str):
+def change_task_status(
+    task_id: int,
+    status: str,
+    expected_statuses: Optional[List[str]] = None,
+    dedup_key: Optional[str] = None,
+) -> int:
     """Меняет статус задачи по ее id."""
+    logger.info(f"Changing task {task_id}")
+    return _change_status(
+        Task.objects.filter(pk=task_id), status, expected_statuses, dedup_key
+    )
+
+
+@shared_task(name="change_idp_status_batch")
+def change_idp_status_batch(
+    idp_ids: List[str],
+    status: str,
+    expected_statuses: Optional[List[str]] = None,
+    dedup_key: Optional[str] = None,
+) -> int:
+    """Меняет статус нескольких ИПР пакетами."""
+    changed = _change_status(
+        IDP.objects.filter(pk__in=idp_ids),
+        status,
+        expected_statuses,
+        dedup_key,
+    )
+    logger.info(f"Changed {changed} of {len(idp_ids)} idps to {status}")
+    return changed
+
+
+@shared_task(name="change_task_status_batch")
+def change_task_status_batch(
+    task_ids: List[int],
+    status: str,
+    expected_statuses: Optional[List[str]] = None,
+    dedup_key: Optional[str] = None,
+) -> int:
+    """Меняет статус нескольких задач пакетами."""
+    changed = _change_status(
+        Task.objects.filter(pk__in=task_ids),
+        status,
+        expected_statuses,
+        dedup_key,
+    )
+    logger.info(f"Changed {changed} of {len(task_ids)} tasks to {status}")
+    return changed
+
+
+def _change_status(
+    queryset: StatusQuerySet,
+    status: str,
+    expected_statuses: Optional[List[str]] = None,
+    dedup_key: Optional[str] = None,
+) -> int:
+    """
+    Переводит объекты queryset в статус status.
+
+    Повторная доставка сообщения с тем же dedup_key пропускается.
+    Если переданы expected_statuses, меняются только объекты
+    в одном из этих статусов, остальные остаются без изменений.
+    Занятые строки ожидаются, а не пропускаются: разовая задача
+    планировщика не повторяется, и пропущенный переход был бы потерян.
+    """
+    if dedup_key is not None:
+        cache_key = f"{STATUS_TRANSITION_KEY_PREFIX}{dedup_key}"
+        if not cache.add(cache_key, True, STATUS_TRANSITION_DEDUP_TIMEOUT):
+            logger.info(f"Skipped duplicate transition {dedup_key}")
+            return 0
+    if expected_statuses:
+        queryset = queryset.filter(
+            **{f"{queryset.status_field}__in": expected_statuses}
+        )
     try:
-        logger.info(f"Changing task {task_id}")
-        task_obj = Task.objects.get(task_id=task_id)
-        task_obj.task_status = status
-        task_obj.save()
-    except Task.DoesNotExist:
-        logger.error(f"Task obj does not exists {task_id}")
+        changed = queryset.change_status(status)
+    except Exception:
+        if dedup_key is not None:
+            # чтобы повторная попытка не была принята за дубликат
+            cache.delete(cache_key)
+        raise
+    if not changed:
+        logger.info(f"Nothing to change to {status}")
+    return changed
+
+
+@shared_task(name="sweep_deadlines")
+def sweep_deadlines():
+    """
+    Переводит ИПР и задачи в статусы TWO_WEEKS и OVERDUE по срокам.
+
+    Заменяет отдельные задачи планировщика на каждый объект
+    (включается настройкой DEADLINE_SWEEPER). В TWO_WEEKS переходят
+    объекты, у которых отметка "две недели до срока" наступила
+    после прошлого запуска, в OVERDUE - все активные просроченные.
+    Занятые строки пропускаются и переводятся при следующем запуске.
+    """
+    now = timezone.now()
+    two_weeks = timedelta(weeks=2.0)
+    last_run = cache.get(SWEEPER_LAST_RUN_KEY)
+
+    overdue_idps = IDP.objects.filter(
+        status__in=(IdpStatuses.ACTIVE, IdpStatuses.TWO_WEEKS),
+        end_date_plan__lte=now,
+    ).change_status(IdpStatuses.OVERDUE, skip_locked=True)
+    two_weeks_idps = IDP.objects.filter(
+        status=IdpStatuses.ACTIVE, end_date_plan__lte=now + two_weeks
+    )
+    overdue_tasks = Task.objects.filter(
+        task_status__in=(TaskStatuses.ACTIVE, TaskStatuses.TWO_WEEKS),
+        task_end_date_plan__lte=now,
+    ).change_status(TaskStatuses.OVERDUE, skip_locked=True)
+    two_weeks_tasks = Task.objects.filter(
+        task_status=TaskStatuses.ACTIVE,
+        task_end_date_plan__lte=now + two_weeks,
+    )
+    if last_run is not None:
+        two_weeks_idps = two_weeks_idps.filter(
+            end_date_plan__gt=last_run + two_weeks
+        )
+        two_weeks_tasks = two_weeks_tasks.filter(
+            task_end_date_plan__gt=last_run + two_weeks
+        )
+    changed_idps = two_weeks_idps.change_status(
+        IdpStatuses.TWO_WEEKS, skip_locked=True
+    )
+    changed_tasks = two_weeks_tasks.change_status(
+        TaskStatuses.TWO_WEEKS, skip_locked=True
+    )
+    # занятые другими транзакциями строки остались в статусе ACTIVE,
+    # окно не сдвигается, пока они не будут переведены
+    if two_weeks_idps.exists() or two_weeks_tasks.exists():
+        logger.info("Some rows were locked, sweeper window is kept")
+    else:
+        cache.set(SWEEPER_LAST_RUN_KEY, now, None)
+    logger.info(
+        f"Deadlines swept: idps two weeks {changed_idps}, "
+        f"overdue {overdue_idps}; tasks two weeks {changed_tasks}, "
+        f"overdue {overdue_tasks}"
+    )
+
+
+@shared_task(name="purge_schedules")
+def purge_schedules():
+    """Удаляет отработавшие задачи планировщика и пустые расписания."""
+    purge_spent_schedules()
+
+
+@shared_task(name="purge_uploads")
+def purge_uploads():
+    """Удаляет незавершенные загрузки файлов и их части."""
+    uploads.purge_stale_uploads()
+
+
+@shared_task(name="purge_exports")
+def purge_exports():
+    """Удаляет устаревшие фоновые экспорты и их файлы."""
+    exports.purge_stale_exports()
+
+
+@shared_task(name="export_subordinates_idps")
+def export_subordinates_idps(export_id: str) -> str:
+    """Собирает Excel-файл с ИПР подчиненных пользователя."""
+    return exports.export_subordinates_idps(export_id)
+
+
+@shared_task(name="dispatch_notifications")
+def dispatch_notifications(event_ids: Optional[List[int]] = None):
+    """
+    Создает уведомления по событиям из outbox.
+
+    События по одному объекту схлопываются, строки уведомлений
+    создаются одним bulk_create на таблицу. Без event_ids
+    обрабатывает все накопившиеся события.
+    """
+    while True:
+        with transaction.atomic():
+            events = NotificationEvent.objects.select_related(
+                "idp__employee__chief",
+                "task__idp__employee__chief",
+                "task__task_mentor",
+            ).select_for_update(skip_locked=True, of=("self",))
+            if event_ids is not None:
+                events = events.filter(event_id__in=event_ids)
+            events = list(events[:NOTIFICATION_DISPATCH_BATCH_SIZE])
+            if not events:
+                return
+            _create_notifications(events)
+            NotificationEvent.objects.filter(
+                pk__in=[event.pk for event in events]
+            ).delete()
+        logger.info(f"Dispatched {len(events)} notification events")
+        if len(events) < NOTIFICATION_DISPATCH_BATCH_SIZE:
+            return
+
+
+def _create_notifications(events: List[NotificationEvent]):
+    """Группирует события по объектам и создает уведомления."""
+    relation_keys = defaultdict(list)
+    for event in events:
+        relation_keys[event.idp or event.task].append(event.relation_key)
+
+    notifications = {IDP: [], Task: []}
+    for obj, keys in relation_keys.items():
+        if isinstance(obj, IDP):
+            relations, statuses = IdpNoteRelation, IdpStatuses.values
+        else:
+            relations, statuses = TaskNoteRelation, TaskStatuses.values
+        for key in coalesce_relation_keys(keys, statuses):
+            trigger = relations[key]
+            note = get_notification(trigger.get("note"))
+            if note is not None:
+                notifications[type(obj)].extend(
+                    obj._build_notifications(trigger, note)
+                )
+    created = IdpNotification.objects.bulk_create(notifications[IDP])
+    created += TaskNotification.objects.bulk_create(notifications[Task])
+    # bulk_create не отправляет post_save, поэтому обработка здесь
+    transaction.on_commit(lambda: handle_created_notifications(created))
@@ -0,0 +1,612 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_celery_beat.models import ClockedSchedule, PeriodicTask
+
+from core.choices import IdpStatuses, NotificationTriggers, TaskStatuses
+from core.task_manager import purge_spent_schedules, set_status_task
+from idp import sched
+from users.models import User
+
+from .blobs import (
+    acquire_blob,
+    delete_blob_file,
+    get_blob_name,
+    store_file,
+    write_temp_blob,
+)
+from .models import (
+    IDP,
+    Blob,
+    File,
+    IdpNotification,
+    IDPQuerySet,
+    Notification,
+    NotificationEvent,
+    Task,
+    TaskNotification,
+)
+from .notifications import (
+    UNREAD_COUNT_KEY,
+    get_unread_count,
+    mark_notifications_read,
+    reset_unread_counts,
+)
+from .tasks import (
+    SWEEPER_LAST_RUN_KEY,
+    change_idp_status,
+    dispatch_notifications,
+    sweep_deadlines,
+)
+
+LOCK_HOLD_SECONDS = 0.5
+
+
+class RowLock(threading.Thread):
+    """
+    Блокирует строки queryset в отдельном потоке и соединении.
+
+    Блокировка держится LOCK_HOLD_SECONDS, затем транзакция
+    завершается. Использовать как контекстный менеджер.
+    """
+
+    def __init__(self, queryset):
+        super().__init__()
+        self.queryset = queryset
+        self.locked = threading.Event()
+
+    def run(self):
+        try:
+            with transaction.atomic():
+                list(self.queryset.select_for_update())
+                self.locked.set()
+                time.sleep(LOCK_HOLD_SECONDS)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.start()
+        self.locked.wait()
+        return self
+
+    def __exit__(self, *args):
+        self.join()
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class SweepDeadlinesTest(TransactionTestCase):
+    """Проверяет, что sweep_deadlines не теряет занятые строки."""
+
+    def setUp(self):
+        cache.clear()
+        self.employee = User.objects.create(
+            email="employee@example.com", first_name="И", last_name="И"
+        )
+
+    def test_locked_idp_is_swept_on_next_run(self):
+        now = timezone.now()
+        cache.set(SWEEPER_LAST_RUN_KEY, now - timedelta(hours=1), None)
+        # отметка "две недели до срока" прошла после прошлого запуска
+        idp = IDP.objects.create(
+            name="ИПР",
+            employee=self.employee,
+            status=IdpStatuses.ACTIVE,
+            end_date_plan=now + timedelta(weeks=2, minutes=-30),
+        )
+        with RowLock(IDP.objects.filter(pk=idp.pk)):
+            sweep_deadlines()
+            idp.refresh_from_db()
+            self.assertEqual(idp.status, IdpStatuses.ACTIVE)
+        sweep_deadlines()
+        idp.refresh_from_db()
+        self.assertEqual(idp.status, IdpStatuses.TWO_WEEKS)
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ChangeStatusTaskTest(TransactionTestCase):
+    """Проверяет разовые задачи смены статуса."""
+
+    def setUp(self):
+        cache.clear()
+        self.idp = IDP.objects.create(
+            name="ИПР",
+            employee=User.objects.create(
+                email="employee@example.com", first_name="И", last_name="И"
+            ),
+            status=IdpStatuses.ACTIVE,
+            end_date_plan=timezone.now() + timedelta(weeks=2),
+        )
+
+    def test_transition_waits_for_locked_row(self):
+        with RowLock(IDP.objects.filter(pk=self.idp.pk)):
+            changed = change_idp_status(
+                str(self.idp.pk),
+                IdpStatuses.TWO_WEEKS,
+                [IdpStatuses.ACTIVE],
+                dedup_key="idp_two_weeks_test",
+            )
+        self.assertEqual(changed, 1)
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status, IdpStatuses.TWO_WEEKS)
+
+    def test_duplicate_delivery_is_skipped(self):
+        args = (str(self.idp.pk), IdpStatuses.TWO_WEEKS, [IdpStatuses.ACTIVE])
+        self.assertEqual(change_idp_status(*args, dedup_key="key"), 1)
+        IDP.objects.filter(pk=self.idp.pk).update(status=IdpStatuses.ACTIVE)
+        self.assertEqual(change_idp_status(*args, dedup_key="key"), 0)
+
+
+class TaskCountersTest(TestCase):
+    """Проверяет счетчики задач ИПР при удалении."""
+
+    def setUp(self):
+        self.employee = User.objects.create(
+            email="employee@example.com", first_name="И", last_name="И"
+        )
+
+    def create_idp(self, tasks_count: int) -> IDP:
+        idp = IDP.objects.create(name="ИПР", employee=self.employee)
+        for number in range(tasks_count):
+            Task.objects.create(
+                task_name=f"Задача {number}", task_description="-", idp=idp
+            )
+        return idp
+
+    def test_task_delete_updates_counters(self):
+        idp = self.create_idp(3)
+        idp.tasks.first().delete()
+        idp.refresh_from_db()
+        self.assertEqual(idp.tasks_total, 2)
+
+    def test_idp_delete_queries_do_not_depend_on_tasks(self):
+        queries = []
+        for tasks_count in (2, 20):
+            idp = self.create_idp(tasks_count)
+            with CaptureQueriesContext(connection) as context:
+                idp.delete()
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+
+class BlobFileTest(TransactionTestCase):
+    """Проверяет, что файл Blob удаляется только вместе со строкой."""
+
+    CONTENT = b"blob-content"
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.digest = hashlib.sha256(self.CONTENT).hexdigest()
+        self.path = os.path.join(media_root.name, get_blob_name(self.digest))
+
+    def acquire(self):
+        acquire_blob(*write_temp_blob(ContentFile(self.CONTENT)))
+
+    def test_file_of_uncommitted_blob_is_kept(self):
+        acquired = threading.Event()
+
+        def acquire_and_hold():
+            try:
+                with transaction.atomic():
+                    self.acquire()
+                    acquired.set()
+                    time.sleep(LOCK_HOLD_SECONDS)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=acquire_and_hold)
+        thread.start()
+        acquired.wait()
+        delete_blob_file(self.digest)
+        thread.join()
+        self.assertEqual(Blob.objects.get().refs, 1)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_failed_store_keeps_existing_blob_file(self):
+        self.acquire()
+        with mock.patch.object(File, "save", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                store_file(File(), ContentFile(self.CONTENT))
+        self.assertEqual(Blob.objects.get().refs, 1)
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_failed_store_removes_new_blob_file(self):
+        with mock.patch.object(File, "save", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                store_file(File(), ContentFile(self.CONTENT))
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(self.path))
+
+
+class NotificationTestCase(TestCase):
+    """Сотрудник с руководителем, ментором и уведомлениями на все триггеры."""
+
+    def setUp(self):
+        cache.clear()
+        self.chief = User.objects.create(
+            email="chief@example.com", first_name="Р", last_name="Р"
+        )
+        self.employee = User.objects.create(
+            email="employee@example.com",
+            first_name="И",
+            last_name="И",
+            chief=self.chief,
+        )
+        self.mentor = User.objects.create(
+            email="mentor@example.com", first_name="М", last_name="М"
+        )
+        Notification.objects.bulk_create(
+            Notification(trigger=trigger, name=trigger)
+            for trigger in NotificationTriggers.values
+        )
+
+    def create_idp(self, **kwargs) -> IDP:
+        kwargs.setdefault("name", "ИПР")
+        kwargs.setdefault("status", IdpStatuses.ACTIVE)
+        return IDP.objects.create(employee=self.employee, **kwargs)
+
+    def create_task(self, idp: IDP, **kwargs) -> Task:
+        return Task.objects.create(
+            task_name="Задача",
+            task_description="-",
+            task_mentor=self.mentor,
+            idp=idp,
+            **kwargs,
+        )
+
+    def get_triggers(self, model) -> list:
+        return sorted(
+            model.objects.values_list("notification__trigger", flat=True)
+        )
+
+
+class NotificationOutboxTest(NotificationTestCase):
+    """Проверяет outbox событий для уведомлений."""
+
+    def test_events_are_dispatched_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_idp()
+            self.assertEqual(NotificationEvent.objects.count(), 1)
+            self.assertFalse(IdpNotification.objects.exists())
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(
+            self.get_triggers(IdpNotification),
+            [NotificationTriggers.IDP_CREATED],
+        )
+        self.assertEqual(IdpNotification.objects.get().receiver, self.employee)
+
+    def test_rolled_back_change_records_no_events(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    self.create_idp()
+                    raise DatabaseError
+        self.assertEqual(callbacks, [])
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertFalse(IdpNotification.objects.exists())
+
+    def test_field_changes_are_coalesced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = self.create_task(self.create_idp())
+        TaskNotification.objects.all().delete()
+        task.task_description = "Новое описание"
+        task.task_end_date_plan = timezone.now() + timedelta(days=30)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertEqual(
+            self.get_triggers(TaskNotification),
+            [NotificationTriggers.TASK_UPDATED],
+        )
+
+    def test_status_change_is_kept_with_field_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = self.create_task(self.create_idp())
+        TaskNotification.objects.all().delete()
+        task.task_status = TaskStatuses.CANCELLED
+        task.task_note_chief = "Не актуально"
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertEqual(
+            self.get_triggers(TaskNotification),
+            sorted(
+                [
+                    NotificationTriggers.TASK_CANCELLED,
+                    NotificationTriggers.TASK_CANCELLED,
+                    NotificationTriggers.TASK_COMMENT_ADDED,
+                ]
+            ),
+        )
+
+    def test_events_are_applied_in_process(self):
+        task = sched.tasks["dispatch_notifications"]
+        with mock.patch("idp_app.notifications.NOTIFICATIONS_ASYNC", False):
+            with mock.patch.object(task, "delay") as delay:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.create_idp()
+        delay.assert_not_called()
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(IdpNotification.objects.count(), 1)
+
+    def test_events_are_sent_to_worker(self):
+        task = sched.tasks["dispatch_notifications"]
+        with mock.patch("idp_app.notifications.NOTIFICATIONS_ASYNC", True):
+            with mock.patch.object(task, "delay") as delay:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.create_idp()
+        event = NotificationEvent.objects.get()
+        delay.assert_called_once_with([event.pk])
+        self.assertFalse(IdpNotification.objects.exists())
+
+    def test_leftover_events_are_dispatched(self):
+        # после коммита процесс упал, и события остались в outbox
+        with self.captureOnCommitCallbacks(execute=False):
+            self.create_idp()
+            self.create_idp(name="Второй ИПР")
+        self.assertEqual(NotificationEvent.objects.count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch_notifications()
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(IdpNotification.objects.count(), 2)
+
+
+class UnreadCountTest(NotificationTestCase):
+    """Проверяет кеш счетчика непрочитанных уведомлений."""
+
+    def setUp(self):
+        super().setUp()
+        self.key = UNREAD_COUNT_KEY.format(self.employee.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.idp = self.create_idp()
+        self.assertEqual(get_unread_count(self.employee.pk), 1)
+
+    def test_created_notification_resets_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_idp(name="Второй ИПР")
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(get_unread_count(self.employee.pk), 2)
+
+    def test_read_all_resets_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_notifications_read(self.employee)
+        self.assertEqual(get_unread_count(self.employee.pk), 0)
+
+    def test_deleted_notification_resets_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            IdpNotification.objects.get().delete()
+        self.assertEqual(get_unread_count(self.employee.pk), 0)
+
+    def test_count_reset_during_recount_is_not_cached(self):
+        cache.delete(self.key)
+        count, counted = QuerySet.count, []
+
+        def count_and_create(queryset):
+            result = count(queryset)
+            if not counted:
+                # после подсчета создано и обработано новое уведомление
+                note = IdpNotification.objects.get()
+                note.pk = None
+                note.save()
+                reset_unread_counts([self.employee.pk])
+            counted.append(queryset)
+            return result
+
+        with mock.patch.object(
+            QuerySet, "count", autospec=True, side_effect=count_and_create
+        ):
+            get_unread_count(self.employee.pk)
+        self.assertNotEqual(cache.get(self.key), 1)
+        self.assertEqual(get_unread_count(self.employee.pk), 2)
+
+
+class StatusCascadeTest(NotificationTestCase):
+    """Проверяет пакетную смену статусов ИПР и задач."""
+
+    def setUp(self):
+        super().setUp()
+        self.idp = self.create_idp()
+        self.tasks = [
+            self.create_task(self.idp, task_status=TaskStatuses.ACTIVE)
+            for _ in range(3)
+        ]
+        NotificationEvent.objects.all().delete()
+
+    def get_events(self) -> list:
+        return sorted(
+            (event.idp_id is not None, event.relation_key)
+            for event in NotificationEvent.objects.all()
+        )
+
+    def test_idp_status_cascades_to_tasks(self):
+        changed = IDP.objects.filter(pk=self.idp.pk).change_status(
+            IdpStatuses.CANCELLED
+        )
+        self.assertEqual(changed, 1)
+        self.assertEqual(
+            set(self.idp.tasks.values_list("task_status", flat=True)),
+            {TaskStatuses.CANCELLED_WITH_IDP},
+        )
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status, IdpStatuses.CANCELLED)
+        self.assertEqual(self.idp.tasks_total, 3)
+        self.assertEqual(self.idp.tasks_cancelled, 3)
+        self.assertEqual(
+            self.get_events(),
+            [(False, TaskStatuses.CANCELLED_WITH_IDP)] * 3
+            + [(True, IdpStatuses.CANCELLED)],
+        )
+
+    def test_changes_are_made_in_batches(self):
+        idps = [self.idp] + [self.create_idp() for _ in range(4)]
+        NotificationEvent.objects.all().delete()
+        with mock.patch.object(
+            IDPQuerySet,
+            "_after_status_change",
+            autospec=True,
+            side_effect=IDPQuerySet._after_status_change,
+        ) as after:
+            changed = IDP.objects.filter(
+                pk__in=[idp.pk for idp in idps]
+            ).change_status(IdpStatuses.CANCELLED, batch_size=2)
+        self.assertEqual(changed, 5)
+        self.assertEqual(
+            [len(call.args[1]) for call in after.call_args_list], [2, 2, 1]
+        )
+        self.assertEqual(
+            IDP.objects.filter(status=IdpStatuses.CANCELLED).count(), 5
+        )
+        self.assertEqual(
+            self.get_events().count((True, IdpStatuses.CANCELLED)), 5
+        )
+
+    def test_unchanged_objects_are_skipped(self):
+        changed = IDP.objects.filter(pk=self.idp.pk).change_status(
+            IdpStatuses.ACTIVE
+        )
+        self.assertEqual(changed, 0)
+        self.assertEqual(self.get_events(), [])
+
+    def test_last_closed_task_completes_idp(self):
+        first, *others = self.tasks
+        Task.objects.filter(pk=first.pk).change_status(TaskStatuses.CLOSED)
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status, IdpStatuses.ACTIVE)
+        self.assertEqual(self.idp.tasks_closed, 1)
+        Task.objects.filter(pk__in=[task.pk for task in others]).change_status(
+            TaskStatuses.CLOSED
+        )
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.status, IdpStatuses.COMPLETED_APPROVAL)
+        self.assertEqual(self.idp.tasks_closed, 3)
+        self.assertEqual(
+            self.get_events(),
+            [(False, TaskStatuses.CLOSED)] * 3
+            + [(True, IdpStatuses.COMPLETED_APPROVAL)],
+        )
+
+
+class ChangeTrackingTest(NotificationTestCase):
+    """Проверяет сохранение только измененных полей без лишних запросов."""
+
+    def setUp(self):
+        super().setUp()
+        self.idp = IDP.objects.get(pk=self.create_idp(target="Цель").pk)
+        self.task = Task.objects.get(pk=self.create_task(self.idp).pk)
+        NotificationEvent.objects.all().delete()
+
+    def capture_save(self, obj) -> list:
+        with CaptureQueriesContext(connection) as context:
+            obj.save()
+        return [query["sql"] for query in context.captured_queries]
+
+    def get_events(self) -> list:
+        return list(
+            NotificationEvent.objects.values_list("relation_key", flat=True)
+        )
+
+    def test_unchanged_save_does_nothing(self):
+        with self.assertNumQueries(0):
+            self.idp.save()
+            self.task.save()
+
+    def test_only_dirty_fields_are_updated(self):
+        self.idp.name = "Новое имя"
+        queries = self.capture_save(self.idp)
+        self.assertFalse([sql for sql in queries if sql.startswith("SELECT")])
+        (update,) = [sql for sql in queries if sql.startswith("UPDATE")]
+        self.assertIn('"name"', update)
+        self.assertNotIn('"target"', update)
+        self.assertNotIn('"status"', update)
+        self.assertEqual(self.get_events(), ["updated"])
+
+    def test_snapshot_follows_saves(self):
+        self.task.task_mentor = self.employee
+        self.capture_save(self.task)
+        self.assertEqual(self.task.get_dirty_fields(), {})
+        self.assertEqual(
+            self.task.get_previous_value("task_mentor_id"), self.employee.pk
+        )
+        self.task.task_mentor = self.mentor
+        queries = self.capture_save(self.task)
+        self.assertFalse([sql for sql in queries if sql.startswith("SELECT")])
+        self.assertEqual(self.get_events(), ["task_mentor_id"] * 2)
+
+    def test_explicit_update_fields_are_respected(self):
+        self.idp.name = "Новое имя"
+        self.idp.target = "Новая цель"
+        self.idp.save(update_fields=["target"])
+        self.idp.refresh_from_db()
+        self.assertEqual(self.idp.name, "ИПР")
+        self.assertEqual(self.idp.target, "Новая цель")
+
+
+class ScheduleTest(TestCase):
+    """Проверяет переиспользование и очистку расписаний beat."""
+
+    def setUp(self):
+        self.clocked_time = timezone.now() + timedelta(days=1)
+
+    def set_task(self, name: str, clocked_time=None) -> PeriodicTask:
+        return set_status_task(
+            name,
+            "change_idp_status",
+            clocked_time or self.clocked_time,
+            {"status": IdpStatuses.OVERDUE},
+        )
+
+    def test_schedule_is_shared(self):
+        first = self.set_task("first")
+        second = self.set_task("second")
+        self.assertEqual(ClockedSchedule.objects.count(), 1)
+        self.assertEqual(first.clocked_id, second.clocked_id)
+
+    def test_task_is_updated_in_place(self):
+        self.set_task("task")
+        later = self.clocked_time + timedelta(days=1)
+        task = self.set_task("task", later)
+        self.assertEqual(PeriodicTask.objects.get().pk, task.pk)
+        self.assertEqual(task.clocked.clocked_time, later)
+        self.assertIn(later.isoformat(), json.loads(task.kwargs)["dedup_key"])
+
+    def test_spent_tasks_and_orphaned_schedules_are_purged(self):
+        later = self.clocked_time + timedelta(days=1)
+        self.set_task("pending")
+        for name in ("spent-1", "spent-2"):
+            self.set_task(name, later)
+        PeriodicTask.objects.filter(name__startswith="spent").update(
+            enabled=False
+        )
+        other = PeriodicTask.objects.create(
+            clocked=ClockedSchedule.objects.create(clocked_time=later),
+            one_off=True,
+            enabled=False,
+            name="other",
+            task="purge_uploads",
+        )
+        self.assertEqual(purge_spent_schedules(batch_size=1), (2, 1))
+        self.assertEqual(
+            sorted(PeriodicTask.objects.values_list("name", flat=True)),
+            ["other", "pending"],
+        )
+        self.assertEqual(
+            set(ClockedSchedule.objects.values_list("pk", flat=True)),
+            {
+                PeriodicTask.objects.get(name="pending").clocked_id,
+                other.clocked_id,
+            },
+        )
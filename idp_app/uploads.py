@@ -0,0 +1,218 @@
+import logging
+import uuid
+from datetime import timedelta
+from typing import Iterator, Tuple
+
+from django.core.files import File as DjangoFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from core.constants import DOWNLOAD_CHUNK_SIZE, UPLOAD_EXPIRE_HOURS
+
+from .blobs import move_storage_file, store_temp_blob, write_temp_blob
+from .models import File, FileUpload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PART_PATH = "upload_parts/{}/{:020d}"
+UPLOAD_TMP_DIR = "upload_parts/{}/tmp"
+
+
+class UploadConflict(Exception):
+    """Часть не совпадает с состоянием загрузки; offset - сколько получено."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class LimitedReader:
+    """Читает из потока запроса не больше size байт."""
+
+    def __init__(self, stream, size: int):
+        self.stream = stream
+        self.size = size
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+
+class PartsReader:
+    """Читает части загрузки подряд как один файл."""
+
+    def __init__(self, upload: FileUpload):
+        self.size = upload.size
+        self.parts = iter_part_names(upload)
+        self.current = None
+
+    def chunks(self) -> Iterator[bytes]:
+        while True:
+            data = self.read(DOWNLOAD_CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self.current is None:
+                name = next(self.parts, None)
+                if name is None:
+                    return b""
+                self.current = default_storage.open(name, "rb")
+            data = self.current.read(size)
+            if data:
+                return data
+            self.current.close()
+            self.current = None
+
+
+def iter_part_names(upload: FileUpload) -> Iterator[str]:
+    """Возвращает имена сохраненных частей загрузки по порядку."""
+    offset = 0
+    while offset < upload.offset:
+        name = UPLOAD_PART_PATH.format(upload.pk, offset)
+        yield name
+        offset += default_storage.size(name)
+
+
+def delete_parts(upload: FileUpload):
+    """Удаляет сохраненные и недописанные части загрузки из хранилища."""
+    for name in list(iter_part_names(upload)):
+        default_storage.delete(name)
+    tmp_dir = UPLOAD_TMP_DIR.format(upload.pk)
+    try:
+        _, tmp_names = default_storage.listdir(tmp_dir)
+    except FileNotFoundError:
+        return
+    for tmp_name in tmp_names:
+        default_storage.delete(f"{tmp_dir}/{tmp_name}")
+
+
+def check_chunk(upload: FileUpload, offset: int, length: int):
+    """Проверяет, что часть продолжает полученные данные загрузки."""
+    if upload.completing:
+        raise UploadConflict("Загрузка уже завершается.", upload.offset)
+    if offset != upload.offset:
+        raise UploadConflict(
+            "Смещение не совпадает с полученными данными.", upload.offset
+        )
+    if offset + length > upload.size:
+        raise UploadConflict("Часть выходит за размер файла.", upload.offset)
+
+
+def lock_upload(upload_id) -> FileUpload:
+    """
+    Блокирует строку загрузки до конца транзакции.
+
+    Если загрузка уже завершена или удалена, бросает
+    FileUpload.DoesNotExist.
+    """
+    upload = (
+        FileUpload.objects.select_for_update().filter(pk=upload_id).first()
+    )
+    if upload is None:
+        raise FileUpload.DoesNotExist("Загрузка завершена или удалена.")
+    return upload
+
+
+def write_upload_chunk(
+    upload: FileUpload, offset: int, stream, length: int
+) -> FileUpload:
+    """
+    Сохраняет часть файла из потока запроса в хранилище.
+
+    Часть принимается, только если offset равен количеству уже
+    полученных байт. Тело запроса читается во временный файл
+    без блокировок, затем строка загрузки блокируется только
+    на проверку offset и перенос части на ее место, поэтому
+    одну загрузку не могут дописать два запроса сразу.
+    """
+    check_chunk(upload, offset, length)
+    reader = LimitedReader(stream, length)
+    tmp_name = default_storage.save(
+        f"{UPLOAD_TMP_DIR.format(upload.pk)}/{uuid.uuid4().hex}",
+        DjangoFile(reader),
+    )
+    try:
+        if reader.remaining:
+            raise UploadConflict("Часть получена не полностью.", offset)
+        with transaction.atomic():
+            upload = lock_upload(upload.pk)
+            check_chunk(upload, offset, length)
+            name = UPLOAD_PART_PATH.format(upload.pk, offset)
+            # часть могла остаться от оборванной попытки
+            default_storage.delete(name)
+            move_storage_file(tmp_name, name)
+            upload.offset += length
+            upload.save(update_fields=("offset",))
+    finally:
+        # после переноса временного файла уже нет
+        default_storage.delete(tmp_name)
+    return upload
+
+
+def complete_upload(upload_id) -> Tuple[File, str]:
+    """
+    Собирает загруженные части в объект File.
+
+    Строка загрузки блокируется дважды и ненадолго: первый раз,
+    чтобы пометить загрузку завершаемой, второй - чтобы создать
+    File и удалить загрузку. Части читаются и хешируются между
+    блокировками, поэтому чтение и запись файла не держат
+    транзакцию. Возвращает File и его SHA-256. Если клиент
+    передал sha256 и сумма не совпала, бросает ValueError.
+    """
+    with transaction.atomic():
+        upload = lock_upload(upload_id)
+        if upload.completing:
+            raise UploadConflict("Загрузка уже завершается.", upload.offset)
+        if upload.offset != upload.size:
+            raise UploadConflict("Файл получен не полностью.", upload.offset)
+        upload.completing = True
+        upload.save(update_fields=("completing",))
+    part_names = list(iter_part_names(upload))
+    try:
+        tmp_name, digest, size = write_temp_blob(PartsReader(upload))
+    except Exception:
+        FileUpload.objects.filter(pk=upload.pk).update(completing=False)
+        raise
+    if upload.sha256 and upload.sha256.lower() != digest:
+        default_storage.delete(tmp_name)
+        FileUpload.objects.filter(pk=upload.pk).update(completing=False)
+        raise ValueError("Контрольная сумма файла не совпадает.")
+    file_obj = File(
+        file_name=upload.file_name,
+        file_type=upload.file_type,
+        file_task_id=upload.file_task_id,
+    )
+    try:
+        with transaction.atomic():
+            # загрузку могли удалить, пока собирались части
+            lock_upload(upload.pk).delete()
+            store_temp_blob(file_obj, tmp_name, digest, size)
+    except Exception:
+        default_storage.delete(tmp_name)
+        FileUpload.objects.filter(pk=upload.pk).update(completing=False)
+        raise
+    for name in part_names:
+        default_storage.delete(name)
+    logger.info(f"Upload completed as file {file_obj.pk}")
+    return file_obj, digest
+
+
+def purge_stale_uploads() -> int:
+    """Удаляет загрузки, не завершенные за UPLOAD_EXPIRE_HOURS."""
+    expired = timezone.now() - timedelta(hours=UPLOAD_EXPIRE_HOURS)
+    purged = 0
+    for upload in FileUpload.objects.filter(created__lt=expired).iterator():
+        delete_parts(upload)
+        upload.delete()
+        purged += 1
+    logger.info(f"Purged {purged} stale uploads")
+    return purged
@@ -1,7 +1,9 @@
 import uuid
 
 from django.contrib.auth.base_user import AbstractBaseUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.itercompat import is_iterable
 
 from .managers import CustomUserManager
@@ -81,6 +83,22 @@ class User(AbstractBaseUser):
         ordering = ("last_name", "first_name")
         verbose_name = "User"
         verbose_name_plural = "Users"
+        indexes = (
+            # для поиска по началу ФИО без учета регистра; поиск
+            # объединяет поля через OR, поэтому индекс нужен каждому
+            models.Index(
+                OpClass(Upper("last_name"), name="text_pattern_ops"),
+                name="user_last_name_prefix_idx",
+            ),
+            models.Index(
+                OpClass(Upper("first_name"), name="text_pattern_ops"),
+                name="user_first_name_prefix_idx",
+            ),
+            models.Index(
+                OpClass(Upper("middle_name"), name="text_pattern_ops"),
+                name="user_middle_name_prefix_idx",
+            ),
+        )
 
     def get_full_name(self):
         """